@@ -22,6 +22,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.result_logger import ResultLogger
+from src.hash_cache import HASH_CACHE_FILENAME, HashCache
 
 
 class CppDuplicateChecker:
@@ -37,7 +38,8 @@ class CppDuplicateChecker:
                  detect_pure_color: bool = True,
                  detect_rotation: bool = False,
                  enhanced_similarity: bool = False,
-                 confidence_threshold: float = 0.6):
+                 confidence_threshold: float = 0.6,
+                 use_cache: bool = True):
         """
         初始化图片查重器
         
@@ -50,6 +52,7 @@ class CppDuplicateChecker:
             detect_rotation: 是否启用旋转识别功能，默认为False
             enhanced_similarity: 是否启用增强相似度检测（支持旋转+分辨率变化），默认为False
             confidence_threshold: 增强检测的置信度阈值，默认为0.6
+            use_cache: 是否将增强检测的多尺度哈希缓存到输出目录中，重复扫描时跳过未修改的文件，默认为True
         """
         self.phash_threshold = phash_threshold
         self.dhash_threshold = dhash_threshold
@@ -58,6 +61,7 @@ class CppDuplicateChecker:
         self.detect_rotation = detect_rotation
         self.enhanced_similarity = enhanced_similarity
         self.confidence_threshold = confidence_threshold
+        self.use_cache = use_cache
         self.logger = ResultLogger(output_dir)
         
         # 日志回调函数
@@ -301,14 +305,21 @@ class CppDuplicateChecker:
                 
                 # 使用增强相似度检测进行批量比较
                 image_paths = [item['path'] for item in file_hashes]
-                enhanced_groups = batch_compare_with_enhanced_similarity(
-                    image_paths,
-                    dhash_threshold=self.dhash_threshold + 4,  # 放宽阈值以适应分辨率变化
-                    phash_threshold=self.phash_threshold + 2,
-                    ahash_threshold=self.ahash_threshold + 2,
-                    confidence_threshold=self.confidence_threshold,
-                    log_callback=self.log
-                )
+                cache = HashCache(os.path.join(self.logger.output_dir, HASH_CACHE_FILENAME)) if self.use_cache else None
+                try:
+                    enhanced_groups = batch_compare_with_enhanced_similarity(
+                        image_paths,
+                        dhash_threshold=self.dhash_threshold + 4,  # 放宽阈值以适应分辨率变化
+                        phash_threshold=self.phash_threshold + 2,
+                        ahash_threshold=self.ahash_threshold + 2,
+                        confidence_threshold=self.confidence_threshold,
+                        log_callback=self.log,
+                        cache=cache,
+                        verbose=False  # 大目录下逐对比较的日志会淹没界面，只输出阶段信息和错误
+                    )
+                finally:
+                    if cache is not None:
+                        cache.close()
                 
                 # 转换格式以保持兼容性
                 for group in enhanced_groups:
@@ -510,7 +521,8 @@ class CppDuplicateChecker:
         
         # 从图片列表中移除纯色图片
         if pure_color_images:
-            unique_images = [img for img in unique_images if img not in set(pure_color_images)]
+            pure_color_set = set(pure_color_images)
+            unique_images = [img for img in unique_images if img not in pure_color_set]
         
         # 步骤3: 检查感知上相似的图片
         self.log(f"\n步骤3: 使用C++库检查感知上相似的图片 (共 {len(unique_images)} 个唯一文件)")
@@ -272,6 +272,7 @@ class I18n:
                 "info": "Info",
             }
         }
+        self._active = self.translations[self.current_language]
     
     def get_available_languages(self):
         """获取可用语言列表"""
@@ -284,15 +285,14 @@ class I18n:
         """设置当前语言"""
         if language_code in self.translations:
             self.current_language = language_code
+            self._active = self.translations[language_code]
             return True
         return False
     
     def get_text(self, key, default=None):
         """获取翻译文本"""
-        if default is None:
-            default = key
-        
-        return self.translations.get(self.current_language, {}).get(key, default)
+        # 当前语言的翻译表在切换语言时绑定，每次查找只需一次字典访问
+        return self._active.get(key, key if default is None else default)
     
     def __call__(self, key, default=None):
         """使翻译对象可调用"""
@@ -23,10 +23,10 @@ import json
 import os
 from PIL import Image, ImageTk
 import threading
+import multiprocessing
 import subprocess
 import platform
 import queue
-import time
 import webbrowser
 from cpp_hash_lib.cpp_duplicate_checker import CppDuplicateChecker
 from i18n import I18n
@@ -35,6 +35,9 @@ from i18n import I18n
 i18n = I18n()
 _ = i18n.get_text
 
+# 缩略图重采样滤镜（模块加载时解析一次）
+_LANCZOS = Image.Resampling.LANCZOS
+
 class IntegratedDuplicateApp:
     def __init__(self, root):
         self.root = root
@@ -57,11 +60,19 @@ class IntegratedDuplicateApp:
         self.duplicate_data = []
         self.current_group_index = 0
         self.image_cache = {}
-        self.loading_threads = 0
+        self._current_dist_by_path = {}  # 当前组的 路径 -> 距离信息 索引
         self.max_concurrent_loads = 3
+        self.load_slots = threading.Semaphore(self.max_concurrent_loads)  # 限制并发加载数
         self.load_queue = queue.Queue()
         self.queue_processor_running = False
         
+        # 缓存图片组件中反复使用的界面文本
+        self._refresh_widget_labels()
+        
+        # 共享的占位图片，所有图片标签复用同一个Tk图片对象
+        placeholder = Image.new('RGB', (200, 150), (230, 230, 230))
+        self._placeholder_photo = ImageTk.PhotoImage(placeholder)
+        
         # 扫描相关
         self.scan_directory = ""
         self.is_scanning = False
@@ -69,6 +80,15 @@ class IntegratedDuplicateApp:
         
         self.setup_ui()
         
+        # 关闭窗口时通知队列处理线程退出
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+    def on_close(self):
+        """关闭应用"""
+        # 推入哨兵值，让队列处理线程结束阻塞等待
+        self.load_queue.put(None)
+        self.root.destroy()
+        
     def setup_ui(self):
         # 创建菜单栏
         self.setup_menu()
@@ -116,7 +136,7 @@ class IntegratedDuplicateApp:
         file_menu.add_command(label=_("load_results"), command=self.load_json_file)
         file_menu.add_command(label=_("save_results"), command=self.save_results)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         
         # 语言菜单
         language_menu = tk.Menu(menubar, tearoff=0)
@@ -143,11 +163,24 @@ class IntegratedDuplicateApp:
             self.update_ui_texts()
             self.update_status(_("status_ready"), "success")
     
+    def _refresh_widget_labels(self):
+        """缓存图片组件使用的翻译文本，切换语言时需重新调用"""
+        self._lbl_file_not_exist = _("file_not_exist")
+        self._lbl_load_failed = _("load_failed")
+        self._lbl_copy_path = f"📋 {_('copy_path')}"
+        self._lbl_open_file = f"🖼️ {_('open_file')}"
+        self._lbl_open_folder = f"📁 {_('open_folder')}"
+        self._lbl_distance_names = (_('dhash_distance'), _('phash_distance'), _('ahash_distance'))
+        self._lbl_base_image = f"{_('base_image')} ({_('distance')}: 0)"
+    
     def update_ui_texts(self):
         """更新界面文本"""
         # 更新窗口标题
         self.root.title(_("window_title"))
         
+        # 更新缓存的图片组件文本
+        self._refresh_widget_labels()
+        
         # 更新版权信息
         self.copyright_info = _("copyright")
         
@@ -670,9 +703,6 @@ MIT License
         for widget in self.images_frame.winfo_children():
             widget.destroy()
         
-        # 重置加载线程计数
-        self.loading_threads = 0
-        
         # 清空加载队列
         while not self.load_queue.empty():
             try:
@@ -691,6 +721,9 @@ MIT License
             
         group = self.duplicate_data[self.current_group_index]
         
+        # 预先建立 路径 -> 距离信息 的索引，避免每个图片都线性扫描
+        self._current_dist_by_path = {fi['path']: fi for fi in group.get('files_with_distances', [])}
+        
         # 显示组信息
         info_label = ttk.Label(self.images_frame, text=f"{group['reason']} - {len(group['files'])}{_('images')}", 
                               font=('Arial', 12, 'bold'))
@@ -715,8 +748,8 @@ MIT License
         name_label = ttk.Label(img_frame, text=filename, font=('Arial', 10, 'bold'))
         name_label.pack(pady=(5, 0))
         
-        # 图片标签（占位符）
-        img_label = ttk.Label(img_frame, text=_("loading"), background="lightgray")
+        # 图片标签（占位符，复用共享占位图片，避免文本切换为图片时重新排版）
+        img_label = ttk.Label(img_frame, image=self._placeholder_photo)
         img_label.pack(pady=5)
         
         # 哈希距离信息（如果有的话）
@@ -732,28 +765,28 @@ MIT License
         
         # 复制路径按钮
         try:
-            copy_btn = ttk.Button(btn_frame, text=f"📋 {_('copy_path')}", 
+            copy_btn = ttk.Button(btn_frame, text=self._lbl_copy_path, 
                                  command=lambda: self.copy_path(file_path), bootstyle="secondary-outline")
         except:
-            copy_btn = ttk.Button(btn_frame, text=f"📋 {_('copy_path')}", 
+            copy_btn = ttk.Button(btn_frame, text=self._lbl_copy_path, 
                                  command=lambda: self.copy_path(file_path))
         copy_btn.pack(side=tk.LEFT, padx=(0, 5))
         
         # 打开文件按钮
         try:
-            open_btn = ttk.Button(btn_frame, text=f"🖼️ {_('open_file')}", 
+            open_btn = ttk.Button(btn_frame, text=self._lbl_open_file, 
                                  command=lambda: self.open_file(file_path), bootstyle="info-outline")
         except:
-            open_btn = ttk.Button(btn_frame, text=f"🖼️ {_('open_file')}", 
+            open_btn = ttk.Button(btn_frame, text=self._lbl_open_file, 
                                  command=lambda: self.open_file(file_path))
         open_btn.pack(side=tk.LEFT, padx=(0, 5))
         
         # 打开文件夹按钮
         try:
-            folder_btn = ttk.Button(btn_frame, text=f"📁 {_('open_folder')}", 
+            folder_btn = ttk.Button(btn_frame, text=self._lbl_open_folder, 
                                    command=lambda: self.open_folder(file_path), bootstyle="warning-outline")
         except:
-            folder_btn = ttk.Button(btn_frame, text=f"📁 {_('open_folder')}", 
+            folder_btn = ttk.Button(btn_frame, text=self._lbl_open_folder, 
                                    command=lambda: self.open_folder(file_path))
         folder_btn.pack(side=tk.LEFT)
         
@@ -776,12 +809,8 @@ MIT License
         if 'files_with_distances' not in group:
             return
             
-        # 查找当前文件的距离信息
-        distance_info = None
-        for file_info in group['files_with_distances']:
-            if file_info['path'] == file_path:
-                distance_info = file_info
-                break
+        # 查找当前文件的距离信息（使用display_group_images中建立的索引）
+        distance_info = self._current_dist_by_path.get(file_path)
                 
         if distance_info and index > 0:  # 第一个文件（基准文件）不显示距离
             # 创建距离信息框架
@@ -789,7 +818,8 @@ MIT License
             distance_frame.pack(pady=(0, 5))
             
             # 距离信息标签
-            distance_text = f"{_('dhash_distance')}: {distance_info['dhash_distance']} | {_('phash_distance')}: {distance_info['phash_distance']} | {_('ahash_distance')}: {distance_info['ahash_distance']}"
+            dhash_name, phash_name, ahash_name = self._lbl_distance_names
+            distance_text = f"{dhash_name}: {distance_info['dhash_distance']} | {phash_name}: {distance_info['phash_distance']} | {ahash_name}: {distance_info['ahash_distance']}"
             distance_label = ttk.Label(distance_frame, text=distance_text, 
                                      font=('Arial', 8), foreground="blue")
             distance_label.pack()
@@ -798,36 +828,43 @@ MIT License
             base_frame = ttk.Frame(parent_frame)
             base_frame.pack(pady=(0, 5))
             
-            base_label = ttk.Label(base_frame, text=f"{_('base_image')} ({_('distance')}: 0)", 
+            base_label = ttk.Label(base_frame, text=self._lbl_base_image, 
                                  font=('Arial', 8), foreground="green")
             base_label.pack()
         
     def process_load_queue(self):
         """处理图片加载队列"""
         while True:
+            # 阻塞等待，收到哨兵值None时退出
+            item = self.load_queue.get()
+            if item is None:
+                self.load_queue.task_done()
+                break
+            
             try:
-                file_path, img_label = self.load_queue.get(timeout=1)
-                
-                while self.loading_threads >= self.max_concurrent_loads:
-                    time.sleep(0.1)
+                file_path, img_label = item
                 
-                self.loading_threads += 1
-                threading.Thread(target=self.load_image_async, 
-                                args=(file_path, img_label), daemon=True).start()
-                
-                self.load_queue.task_done()
+                # 等待空闲的加载槽位，由加载线程结束时释放
+                self.load_slots.acquire()
+                try:
+                    threading.Thread(target=self.load_image_async, 
+                                    args=(file_path, img_label), daemon=True).start()
+                except Exception:
+                    self.load_slots.release()
+                    raise
                 
-            except queue.Empty:
-                continue
             except Exception as e:
                 print(f"队列处理错误: {e}")
-                continue
+            finally:
+                self.load_queue.task_done()
+        
+        self.queue_processor_running = False
     
     def load_image_async(self, file_path, img_label):
         """异步加载图片"""
         try:
             if not os.path.exists(file_path):
-                self.root.after(0, lambda: self.safe_update_label(img_label, text=_("file_not_exist"), foreground="red"))
+                self.root.after(0, lambda: self.safe_update_label(img_label, text=self._lbl_file_not_exist, foreground="red"))
                 return
                 
             if file_path in self.image_cache:
@@ -837,7 +874,7 @@ MIT License
                 
             with Image.open(file_path) as img:
                 max_size = (200, 150)
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                img.thumbnail(max_size, _LANCZOS)
                 photo = ImageTk.PhotoImage(img)
                 
                 if len(self.image_cache) < 50:
@@ -846,9 +883,11 @@ MIT License
                 self.root.after(0, lambda: self.safe_update_image_label(img_label, photo))
                 
         except Exception as e:
-            self.root.after(0, lambda: self.safe_update_label(img_label, text=f"{_('load_failed')}: {str(e)}", foreground="red"))
+            # 异常变量在except块结束后会被删除，先格式化好消息再交给回调
+            message = f"{self._lbl_load_failed}: {str(e)}"
+            self.root.after(0, lambda: self.safe_update_label(img_label, text=message, foreground="red"))
         finally:
-            self.loading_threads = max(0, self.loading_threads - 1)
+            self.load_slots.release()
             
     def safe_update_image_label(self, img_label, photo):
         """安全更新图片标签"""
@@ -863,7 +902,8 @@ MIT License
         """安全更新文本标签"""
         try:
             if img_label.winfo_exists():
-                img_label.config(text=text, foreground=foreground)
+                # 清除占位图片，否则文本不会显示
+                img_label.config(image="", text=text, foreground=foreground)
         except tk.TclError:
             pass
         
@@ -926,4 +966,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # 打包为可执行文件后，多进程的子进程需要由此进入
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -13,9 +13,15 @@ __description__ = "一个高效的Python图像查重工具"
 from .duplicate_checker import DuplicateChecker
 from .hash_utils import (
     calculate_file_hash,
+    calculate_partial_hash,
     calculate_dhash,
     calculate_phash,
     calculate_ahash,
+    calculate_all_hashes,
+    calculate_dhash_from_image,
+    calculate_phash_from_image,
+    calculate_ahash_from_image,
+    analyze_image,
     is_pure_color_image
 )
 from .result_logger import ResultLogger
@@ -27,9 +33,15 @@ try:
         "DuplicateChecker",
         "CppDuplicateChecker",  # C++实现版本
         "calculate_file_hash",
+        "calculate_partial_hash",
         "calculate_dhash",
         "calculate_phash",
         "calculate_ahash",
+        "calculate_all_hashes",
+        "calculate_dhash_from_image",
+        "calculate_phash_from_image",
+        "calculate_ahash_from_image",
+        "analyze_image",
         "is_pure_color_image",
         "ResultLogger"
     ]
@@ -38,9 +50,15 @@ except ImportError:
     __all__ = [
         "DuplicateChecker",
         "calculate_file_hash",
+        "calculate_partial_hash",
         "calculate_dhash",
         "calculate_phash",
         "calculate_ahash",
+        "calculate_all_hashes",
+        "calculate_dhash_from_image",
+        "calculate_phash_from_image",
+        "calculate_ahash_from_image",
+        "analyze_image",
         "is_pure_color_image",
         "ResultLogger"
     ]
\ No newline at end of file
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+并查集模块
+
+将相似文件对合并为传递闭包的相似组
+"""
+
+from typing import Iterable, List
+
+
+class DisjointSet:
+    """
+    按大小合并、路径减半的并查集，元素为0到n-1的整数
+    """
+
+    def __init__(self, n: int):
+        """
+        初始化并查集，每个元素各自成为一个集合
+
+        Args:
+            n: 元素数量
+        """
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        """
+        查找元素所在集合的根
+
+        Args:
+            x: 元素
+
+        Returns:
+            根元素
+        """
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> bool:
+        """
+        合并两个元素所在的集合
+
+        Args:
+            a: 第一个元素
+            b: 第二个元素
+
+        Returns:
+            两个元素原本不在同一集合时返回True
+        """
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return False
+
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+    def union_pairs(self, left: Iterable[int], right: Iterable[int]) -> None:
+        """
+        逐对合并元素所在的集合
+
+        父节点相同的元素对已在同一集合，直接跳过，大量相似文件已合并为一个集合时无需逐对查找根
+
+        Args:
+            left: 元素对的第一个元素
+            right: 元素对的第二个元素
+        """
+        parent = self.parent
+        for a, b in zip(left, right):
+            if parent[a] != parent[b]:
+                self.union(a, b)
+
+    def groups(self, min_size: int = 2) -> List[List[int]]:
+        """
+        返回所有集合
+
+        Args:
+            min_size: 只返回元素数不少于此值的集合，默认为2
+
+        Returns:
+            集合列表，每个集合内的元素升序排列，集合按最小元素升序排列
+        """
+        members = {}
+        for x in range(len(self.parent)):
+            members.setdefault(self.find(x), []).append(x)
+        return [group for group in members.values() if len(group) >= min_size]
@@ -7,20 +7,82 @@
 
 import os
 import time
-from collections import defaultdict
-from typing import List, Dict, Any, Tuple, Set, Optional
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
+
+import numpy as np
 
 from .hash_utils import (
     calculate_file_hash, 
-    calculate_dhash, 
-    calculate_phash, 
-    calculate_ahash,
-    hamming_distance,
+    calculate_partial_hash,
+    DEFAULT_FILE_HASH_ALGORITHM,
+    calculate_all_hashes,
+    analyze_image,
     is_pure_color_image
 )
+from .hamming import (
+    INVALID_DISTANCE,
+    popcount64,
+    hex_to_uint64,
+    find_similar_pairs_multi_index
+)
+from .hash_cache import HASH_CACHE_FILENAME, HashCache
+from .disjoint_set import DisjointSet
+from .gpu_hash import is_cuda_available, calculate_all_hashes_batch
 from .result_logger import ResultLogger
 from .rotation_invariant_hash import batch_compare_with_rotation
 
+# 支持的图片扩展名（小写，不含点）
+IMAGE_EXTENSIONS = frozenset({"jpg", "jpeg", "png", "bmp", "gif", "webp"})
+
+# 大文件（超过64MB）使用16MB读取缓冲区，减少机械硬盘寻道次数
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+LARGE_FILE_BUFFER_SIZE = 16 * 1024 * 1024
+
+# 快速预筛选时读取文件头部和尾部的字节数
+PARTIAL_HASH_SIZE = 64 * 1024
+
+# GPU批量计算感知哈希时每批的图片数
+GPU_BATCH_SIZE = 1024
+
+# 感知哈希矩阵的列顺序
+PERCEPTUAL_HASH_KEYS = ('dhash', 'phash', 'ahash')
+
+
+def _call_safely(func, file_path: str):
+    """
+    调用单文件处理函数并捕获异常
+    
+    Args:
+        func: 处理单个文件的函数
+        file_path: 文件路径
+        
+    Returns:
+        (结果, 异常)，处理失败时结果为None
+    """
+    try:
+        return func(file_path), None
+    except Exception as e:
+        return None, e
+
+
+def _perceptual_hashes_of(record: Dict[str, Any]) -> Dict[str, str]:
+    """
+    从analyze_image的结果中取出感知哈希
+    
+    Args:
+        record: analyze_image返回的结果字典
+        
+    Returns:
+        包含'dhash'、'phash'、'ahash'的字典，记录中未计算感知哈希时返回None
+    """
+    if record['dhash'] is None:
+        if record['error'] is not None:
+            raise ValueError(record['error'])
+        return None
+    return {key: record[key] for key in PERCEPTUAL_HASH_KEYS}
+
 
 class DuplicateChecker:
     """
@@ -33,7 +95,12 @@ class DuplicateChecker:
                  ahash_threshold: int = 2,  # 大幅降低aHash阈值至2，减少误判
                  output_dir: str = "results",
                  detect_pure_color: bool = True,
-                 detect_rotation: bool = False):
+                 detect_rotation: bool = False,
+                 max_workers: Optional[int] = None,
+                 hash_buffer_size: int = 1024 * 1024,
+                 file_hash_algorithm: Optional[str] = None,
+                 use_cache: bool = True,
+                 use_gpu: bool = False):
         """
         初始化图片查重器
         
@@ -44,13 +111,24 @@ class DuplicateChecker:
             output_dir: 结果输出目录，默认为"results"
             detect_pure_color: 是否检测并标记纯色图片，默认为True
             detect_rotation: 是否启用旋转识别功能，默认为False
+            max_workers: 并行处理文件的线程数，默认为CPU核心数
+            hash_buffer_size: 计算文件哈希时的读取缓冲区大小，默认为1MB（超过64MB的文件使用16MB）
+            file_hash_algorithm: 完全重复检测使用的文件哈希算法，默认在安装了xxhash时使用'xxh128'，
+                否则使用'md5'；需要取证级别的校验时可指定'sha256'等加密哈希
+            use_cache: 是否将哈希结果缓存到输出目录中，重复扫描时跳过未修改的文件，默认为True
+            use_gpu: 是否在CUDA GPU上批量计算感知哈希（需要PyTorch），默认为False
         """
         self.phash_threshold = phash_threshold
         self.dhash_threshold = dhash_threshold
         self.ahash_threshold = ahash_threshold
         self.detect_pure_color = detect_pure_color
         self.detect_rotation = detect_rotation
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.hash_buffer_size = hash_buffer_size
+        self.file_hash_algorithm = file_hash_algorithm or DEFAULT_FILE_HASH_ALGORITHM
         self.logger = ResultLogger(output_dir)
+        self.use_gpu = use_gpu and is_cuda_available()
+        self.cache = HashCache(os.path.join(output_dir, HASH_CACHE_FILENAME)) if use_cache else None
         
         # 日志回调函数
         self.log_callback = None
@@ -60,6 +138,10 @@ class DuplicateChecker:
         self.phash_groups = []  # 感知哈希相似组
         self.pure_color_images = []  # 纯色图片列表
         
+        # analyze_images的单次解码结果：文件路径 -> 文件哈希、纯色标记和感知哈希
+        self.image_records = {}
+        self.image_errors = {}  # 文件路径 -> 读取失败的异常
+        
         # 统计信息
         self.stats = {
             'total_images': 0,
@@ -90,58 +172,378 @@ class DuplicateChecker:
         else:
             print(message)
     
-    def scan_directory(self, directory: str, recursive: bool = True) -> List[str]:
+    def _map_files(self, func, image_files: List[str]):
+        """
+        使用线程池并行处理文件，按输入顺序逐个返回结果
+        
+        文件读取、哈希计算和图片解码都会释放GIL，因此线程即可充分利用多核
+        
+        Args:
+            func: 处理单个文件的函数，接收文件路径
+            image_files: 图片文件路径列表
+            
+        Yields:
+            (序号, 文件路径, 结果, 异常)，处理失败时结果为None
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda file_path: _call_safely(func, file_path), image_files)
+            for i, (file_path, (result, error)) in enumerate(zip(image_files, results)):
+                yield i, file_path, result, error
+    
+    def _cached(self, kind: str, func):
+        """
+        为单文件处理函数添加缓存，文件修改时间和大小不变时直接返回缓存结果
+        
+        Args:
+            kind: 缓存结果类型，不同参数或算法的结果应使用不同的类型
+            func: 处理单个文件的函数，返回值需可JSON序列化
+            
+        Returns:
+            带缓存的处理函数
+        """
+        if self.cache is None:
+            return func
+        
+        def wrapper(file_path):
+            stat = os.stat(file_path)
+            value = self.cache.get(file_path, kind, stat)
+            if value is None:
+                value = func(file_path)
+                self.cache.set(file_path, kind, stat, value)
+            return value
+        
+        return wrapper
+    
+    def _map_analyzed(self, func, extract, image_files: List[str], batch_func=None):
+        """
+        按输入顺序返回每个文件的结果：已由analyze_images处理的文件从记录中提取，其余文件用func并行计算
+        
+        Args:
+            func: 处理单个文件的函数，用于没有记录的文件
+            extract: 从记录中提取结果的函数，抛出异常表示该文件处理失败，返回None表示记录中没有该结果
+            image_files: 图片文件路径列表
+            batch_func: 可选的批量处理函数，接收文件路径列表，返回一一对应的(结果, 异常)列表，提供时代替func
+            
+        Yields:
+            (序号, 文件路径, 结果, 异常)，处理失败时结果为None
+        """
+        extracted = {}
+        missing = []
+        for file_path in image_files:
+            if file_path in self.image_errors:
+                extracted[file_path] = (None, self.image_errors[file_path])
+                continue
+            if file_path in self.image_records:
+                result, error = _call_safely(extract, self.image_records[file_path])
+                if result is not None or error is not None:
+                    extracted[file_path] = (result, error)
+                    continue
+            missing.append(file_path)
+        
+        if batch_func is not None:
+            computed = dict(zip(missing, batch_func(missing))) if missing else {}
+        else:
+            computed = {file_path: (result, error) for _, file_path, result, error in self._map_files(func, missing)}
+        
+        for i, file_path in enumerate(image_files):
+            result, error = extracted[file_path] if file_path in extracted else computed[file_path]
+            yield i, file_path, result, error
+    
+    def _calculate_hashes_on_gpu(self, image_files: List[str]) -> List[Tuple[Optional[Dict[str, str]], Optional[Exception]]]:
+        """
+        在GPU上批量计算感知哈希，已缓存的文件直接使用缓存结果
+        
+        Args:
+            image_files: 图片文件路径列表
+            
+        Returns:
+            与image_files一一对应的(哈希字典, 异常)列表
+        """
+        results = {}
+        stats = {}
+        for file_path in image_files:
+            if self.cache is None:
+                continue
+            try:
+                stats[file_path] = os.stat(file_path)
+            except OSError as e:
+                results[file_path] = (None, e)
+                continue
+            cached = self.cache.get(file_path, "perceptual:8:box-draft", stats[file_path])
+            if cached is not None:
+                results[file_path] = (cached, None)
+        
+        pending = [file_path for file_path in image_files if file_path not in results]
+        for file_path, (hashes, error) in zip(pending, calculate_all_hashes_batch(
+                pending, 8, GPU_BATCH_SIZE, self.max_workers)):
+            results[file_path] = (hashes, error)
+            if error is None and file_path in stats:
+                self.cache.set(file_path, "perceptual:8:box-draft", stats[file_path], hashes)
+        
+        return [results[file_path] for file_path in image_files]
+    
+    def _process_image(self, file_path: str) -> Dict[str, Any]:
+        """
+        一次读取并解码图片，计算文件哈希、纯色标记和三种感知哈希
+        
+        Args:
+            file_path: 图片文件路径
+            
+        Returns:
+            analyze_image返回的结果字典
+        """
+        return analyze_image(file_path, 8, self.file_hash_algorithm, perceptual=not self.use_gpu)
+    
+    def analyze_images(self, image_files: Iterable[str]) -> List[str]:
+        """
+        对每个文件只读取和解码一次，结果保存在image_records中，
+        之后的完全重复、纯色和感知相似检测都直接使用这些结果
+        
+        Args:
+            image_files: 图片文件路径列表或生成器，遍历的同时即提交处理
+            
+        Returns:
+            全部文件路径列表
+        """
+        self.log("正在读取并分析图片...")
+        kind = f"image:{self.file_hash_algorithm}:8:rgb-stat:box-draft" + (":no-perceptual" if self.use_gpu else "")
+        process = self._cached(kind, self._process_image)
+        scanned_files = []
+        futures = []
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for count, file_path in enumerate(image_files, 1):
+                scanned_files.append(file_path)
+                futures.append(executor.submit(_call_safely, process, file_path))
+                if count % 100 == 0:
+                    self.log(f"已扫描 {count} 个文件...")
+            
+            for i, (file_path, future) in enumerate(zip(scanned_files, futures)):
+                if i % 100 == 0 and i > 0:
+                    self.log(f"已处理 {i}/{len(scanned_files)} 个文件...")
+                
+                record, error = future.result()
+                if error is not None:
+                    self.image_errors[file_path] = error
+                else:
+                    self.image_records[file_path] = record
+        
+        if self.cache is not None:
+            self.cache.commit()
+        
+        return scanned_files
+    
+    def _similarity_reason(self, dhash_distance: int, phash_distance: int, ahash_distance: int) -> str:
+        """
+        根据各算法的距离生成相似原因描述
+        
+        Args:
+            dhash_distance: dHash距离
+            phash_distance: pHash距离
+            ahash_distance: aHash距离
+            
+        Returns:
+            相似原因，如"dHash+pHash相似"
+        """
+        reasons = []
+        if dhash_distance < self.dhash_threshold:
+            reasons.append("dHash")
+        if phash_distance < self.phash_threshold:
+            reasons.append("pHash")
+        if ahash_distance < self.ahash_threshold:
+            reasons.append("aHash")
+        return "+".join(reasons) + "相似"
+    
+    def _calculate_file_hash(self, file_path: str) -> str:
+        """
+        根据文件大小选择读取缓冲区并计算文件哈希
+        
+        Args:
+            file_path: 图片文件路径
+            
+        Returns:
+            文件哈希值
+        """
+        file_size = os.stat(file_path).st_size
+        bufsize = LARGE_FILE_BUFFER_SIZE if file_size > LARGE_FILE_SIZE else self.hash_buffer_size
+        return calculate_file_hash(file_path, bufsize, self.file_hash_algorithm)
+    
+    def _iter_image_files(self, directory: str, recursive: bool = True):
+        """
+        使用os.scandir遍历目录，逐个返回图片文件路径
+        
+        遍历顺序与os.walk相同：先返回当前目录的文件，再按顺序深度优先进入子目录。
+        不进入指向目录的符号链接，无法读取的目录会被跳过。
+        
+        Args:
+            directory: 要扫描的目录
+            recursive: 是否递归扫描子目录
+            
+        Yields:
+            图片文件路径
+        """
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        
+                        # 与os.path.splitext一致：忽略文件名开头的点
+                        stem, dot, extension = entry.name.rpartition('.')
+                        if dot and stem.strip('.') and extension.lower() in IMAGE_EXTENSIONS \
+                                and entry.is_file():
+                            yield entry.path
+            except OSError:
+                continue
+            
+            if recursive:
+                stack.extend(reversed(subdirs))
+    
+    def scan_directory(self, directory: str, recursive: bool = True) -> Iterator[str]:
         """
         扫描目录获取所有图片文件
         
+        返回生成器，调用方可以边遍历目录边处理文件；需要列表时使用list()
+        
         Args:
             directory: 要扫描的目录
             recursive: 是否递归扫描子目录，默认为True
             
         Returns:
-            图片文件路径列表
+            图片文件路径生成器
         """
         if not os.path.exists(directory):
             raise FileNotFoundError(f"目录不存在: {directory}")
         
-        image_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp"}
-        image_files = []
+        return self._iter_image_files(directory, recursive)
+    
+    def _tiered_file_hashes(self, image_files: Iterable[str]) -> Tuple[List[str], Dict[str, str]]:
+        """
+        分三级筛选计算可能重复的文件的哈希
         
-        if recursive:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    if os.path.splitext(file)[1].lower() in image_extensions:
-                        image_files.append(os.path.join(root, file))
-        else:
-            for file in os.listdir(directory):
-                if os.path.isfile(os.path.join(directory, file)) and \
-                   os.path.splitext(file)[1].lower() in image_extensions:
-                    image_files.append(os.path.join(directory, file))
+        先按文件大小分组，再计算头尾部分哈希，最后只对仍然相同的候选文件计算完整哈希。
+        image_files为生成器时，遍历目录的同时即开始计算部分哈希。
         
-        return image_files
+        只用于未经analyze_images处理的文件（单独调用check_exact_duplicates时）；
+        check_duplicates中每个文件解码时都已映射到内存，完整哈希直接在同一份数据上计算，
+        几乎没有额外读取，按大小预筛选反而需要等全部文件扫描完才能开始解码，因此不再分级。
+        
+        Args:
+            image_files: 图片文件路径列表或生成器
+            
+        Returns:
+            (全部文件路径列表, 候选文件路径 -> 完整哈希值的字典)
+        """
+        self.log("正在计算文件的哈希值...")
+        
+        scanned_files = []
+        file_sizes = {}
+        size_groups = defaultdict(list)
+        partial_futures = {}
+        partial_hash_func = self._cached(
+            f"partial:{self.file_hash_algorithm}:{PARTIAL_HASH_SIZE}",
+            lambda path: calculate_partial_hash(path, PARTIAL_HASH_SIZE, self.file_hash_algorithm)
+        )
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # 第一级：大小不同的文件不可能完全相同，大小相同的文件一出现就提交部分哈希计算
+            for count, file_path in enumerate(image_files, 1):
+                scanned_files.append(file_path)
+                if count % 100 == 0:
+                    self.log(f"已扫描 {count} 个文件...")
+                
+                try:
+                    file_size = os.stat(file_path).st_size
+                except OSError as e:
+                    self.log(f"处理文件时出错: {file_path}, 错误: {str(e)}")
+                    continue
+                file_sizes[file_path] = file_size
+                
+                group = size_groups[file_size]
+                group.append(file_path)
+                new_candidates = group if len(group) == 2 else group[-1:] if len(group) > 2 else []
+                for candidate in new_candidates:
+                    partial_futures[candidate] = executor.submit(_call_safely, partial_hash_func, candidate)
+            
+            self.log(f"共 {len(scanned_files)} 个文件，按文件大小筛选后剩余 {len(partial_futures)} 个候选文件")
+            
+            # 第二级：比较文件头部和尾部的部分哈希
+            partial_results = [(file_path, future.result()) for file_path, future in partial_futures.items()]
+        
+        partial_groups = defaultdict(list)
+        partial_hashes = {}
+        for file_path, (partial_hash, error) in partial_results:
+            if error is not None:
+                self.log(f"处理文件时出错: {file_path}, 错误: {str(error)}")
+                continue
+            
+            partial_hashes[file_path] = partial_hash
+            partial_groups[(file_sizes[file_path], partial_hash)].append(file_path)
+        
+        # 第三级：小文件的部分哈希已覆盖整个文件，直接作为完整哈希；大文件再计算完整哈希
+        full_hashes = {}
+        large_candidates = []
+        for files in partial_groups.values():
+            if len(files) < 2:
+                continue
+            for file_path in files:
+                if file_sizes[file_path] <= 2 * PARTIAL_HASH_SIZE:
+                    full_hashes[file_path] = partial_hashes[file_path]
+                else:
+                    large_candidates.append(file_path)
+        
+        if large_candidates:
+            self.log(f"正在计算 {len(large_candidates)} 个候选文件的完整哈希值...")
+        file_hash_func = self._cached(f"file:{self.file_hash_algorithm}", self._calculate_file_hash)
+        for i, file_path, file_hash, error in self._map_files(file_hash_func, large_candidates):
+            if error is not None:
+                self.log(f"处理文件时出错: {file_path}, 错误: {str(error)}")
+                continue
+            full_hashes[file_path] = file_hash
+        
+        if self.cache is not None:
+            self.cache.commit()
+        
+        return scanned_files, full_hashes
     
-    def check_exact_duplicates(self, image_files: List[str]) -> Dict[str, List[str]]:
+    def check_exact_duplicates(self, image_files: Iterable[str]) -> Dict[str, List[str]]:
         """
         检查完全相同的重复图片（基于文件哈希）
         
+        已由analyze_images处理过的文件（check_duplicates的主流程）直接使用解码时顺带计算的文件哈希，
+        不再按大小和部分哈希分级；否则用_tiered_file_hashes分三级筛选计算。
+        image_files可以是scan_directory返回的生成器。
+        
         Args:
-            image_files: 图片文件路径列表
+            image_files: 图片文件路径列表或生成器
             
         Returns:
             哈希值 -> 文件列表的字典
         """
-        file_hash_map = defaultdict(list)
+        if self.image_records:
+            scanned_files = list(image_files)
+            full_hashes = {}
+            self.log(f"正在计算 {len(scanned_files)} 个文件的哈希值...")
+            file_hash_func = self._cached(f"file:{self.file_hash_algorithm}", self._calculate_file_hash)
+            for i, file_path, file_hash, error in self._map_analyzed(
+                    file_hash_func, lambda record: record['file_hash'], scanned_files):
+                if error is not None:
+                    self.log(f"处理文件时出错: {file_path}, 错误: {str(error)}")
+                    continue
+                full_hashes[file_path] = file_hash
+        else:
+            scanned_files, full_hashes = self._tiered_file_hashes(image_files)
         
-        self.log(f"正在计算 {len(image_files)} 个文件的哈希值...")
-        for i, file_path in enumerate(image_files):
-            if i % 100 == 0 and i > 0:
-                self.log(f"已处理 {i}/{len(image_files)} 个文件...")
-            
-            try:
-                file_hash = calculate_file_hash(file_path)
-                file_hash_map[file_hash].append(file_path)
-            except Exception as e:
-                self.log(f"处理文件时出错: {file_path}, 错误: {str(e)}")
+        # 按原始文件顺序分组
+        file_hash_map = defaultdict(list)
+        for file_path in scanned_files:
+            if file_path in full_hashes:
+                file_hash_map[full_hashes[file_path]].append(file_path)
         
         # 只保留有重复的组
         duplicate_groups = {h: files for h, files in file_hash_map.items() if len(files) > 1}
@@ -157,7 +559,7 @@ class DuplicateChecker:
     
     def check_pure_color_images(self, image_files: List[str]) -> List[str]:
         """
-        检测纯色图片
+        检测纯色图片，已由analyze_images处理的文件直接汇总其纯色标记，不再重新解码
         
         Args:
             image_files: 图片文件路径列表
@@ -171,16 +573,21 @@ class DuplicateChecker:
         self.log("正在检测纯色图片...")
         pure_color_images = []
         
-        for i, file_path in enumerate(image_files):
+        for i, file_path, is_pure, error in self._map_analyzed(
+                self._cached("pure_color:rgb:stat", is_pure_color_image), lambda record: record['is_pure_color'], image_files):
             if i % 100 == 0 and i > 0:
                 self.log(f"已处理 {i}/{len(image_files)} 个文件...")
             
-            try:
-                if is_pure_color_image(file_path):
-                    pure_color_images.append(file_path)
-                    self.stats['pure_color_images'] += 1
-            except Exception as e:
-                self.log(f"检测纯色图片时出错: {file_path}, 错误: {str(e)}")
+            if error is not None:
+                self.log(f"检测纯色图片时出错: {file_path}, 错误: {str(error)}")
+                continue
+            
+            if is_pure:
+                pure_color_images.append(file_path)
+                self.stats['pure_color_images'] += 1
+        
+        if self.cache is not None:
+            self.cache.commit()
         
         self.pure_color_images = pure_color_images
         return pure_color_images
@@ -203,7 +610,9 @@ class DuplicateChecker:
                 dhash_threshold=self.dhash_threshold,
                 phash_threshold=self.phash_threshold,
                 ahash_threshold=self.ahash_threshold,
-                log_callback=self.log_callback
+                log_callback=self.log_callback,
+                max_workers=self.max_workers,
+                cache=self.cache
             )
             
             # 更新统计信息
@@ -222,102 +631,69 @@ class DuplicateChecker:
         # 计算所有图片的感知哈希
         self.log(f"正在计算 {len(image_files)} 个文件的感知哈希...")
         
-        # 存储每个文件的dhash和phash
-        file_hashes = []
+        # 按列存储：paths[n]对应hash_matrix第n行，每种哈希为一列连续的uint64数组
+        paths = []
+        hash_matrix = np.zeros((len(image_files), len(PERCEPTUAL_HASH_KEYS)), dtype=np.uint64, order='F')
+        valid = np.zeros(hash_matrix.shape, dtype=bool, order='F')
         
-        for i, file_path in enumerate(image_files):
+        # 优先使用analyze_images的结果，否则一次解码同时计算三种感知哈希，多个文件并行处理
+        for i, file_path, hashes, error in self._map_analyzed(
+                self._cached("perceptual:8:box-draft", calculate_all_hashes), _perceptual_hashes_of, image_files,
+                batch_func=self._calculate_hashes_on_gpu if self.use_gpu else None):
             if i % 100 == 0 and i > 0:
                 self.log(f"已处理 {i}/{len(image_files)} 个文件...")
             
-            try:
-                dhash = calculate_dhash(file_path)
-                phash = calculate_phash(file_path)
-                ahash = calculate_ahash(file_path)
-                
-                file_hashes.append({
-                    'path': file_path,
-                    'dhash': dhash,
-                    'phash': phash,
-                    'ahash': ahash
-                })
-            except Exception as e:
-                self.log(f"计算感知哈希时出错: {file_path}, 错误: {str(e)}")
+            if error is not None:
+                self.log(f"计算感知哈希时出错: {file_path}, 错误: {str(error)}")
+                continue
+            
+            row = len(paths)
+            paths.append(file_path)
+            for k, key in enumerate(PERCEPTUAL_HASH_KEYS):
+                hash_matrix[row, k], valid[row, k] = hex_to_uint64(hashes[key])
+        
+        if self.cache is not None:
+            self.cache.commit()
+        
+        hash_matrix = hash_matrix[:len(paths)]
+        valid = valid[:len(paths)]
         
         # 查找相似图片组
         similar_groups = []
-        processed = set()  # 已处理的文件
         
         self.log("正在查找相似图片组...")
-        for i, file1 in enumerate(file_hashes):
-            if file1['path'] in processed:
-                continue
-            
-            if i % 100 == 0 and i > 0:
-                self.log(f"已处理 {i}/{len(file_hashes)} 个文件...")
+        
+        # 按鸽巢原理把哈希分为阈值个段，只比较至少一段完全相同的文件对，避免O(N²)的全量比较
+        thresholds = (self.dhash_threshold, self.phash_threshold, self.ahash_threshold)
+        similar_pairs = find_similar_pairs_multi_index(hash_matrix, valid, thresholds)
+        
+        # 用并查集合并相似文件对，得到传递闭包的相似组，与遍历顺序无关
+        dsu = DisjointSet(len(paths))
+        pair_reasons = defaultdict(Counter)  # 根 -> 组内各文件对的相似原因计数
+        for i, j, distances in similar_pairs:
+            dsu.union(i, j)
+        for i, j, distances in similar_pairs:
+            pair_reasons[dsu.find(i)][self._similarity_reason(*(int(d) for d in distances))] += 1
+        
+        for members in dsu.groups():
+            anchor = members[0]
             
-            similar_files = []
-            reason = ""
+            # 组内距离均相对于基准文件（组内第一个文件）计算
+            distances = popcount64(hash_matrix[members] ^ hash_matrix[anchor])
+            distances = np.where(valid[members] & valid[anchor], distances, INVALID_DISTANCE)
+            files_with_distances = [{
+                'path': paths[index],
+                'dhash_distance': int(row[0]),
+                'phash_distance': int(row[1]),
+                'ahash_distance': int(row[2])
+            } for index, row in zip(members, distances)]
             
-            for file2 in file_hashes:
-                if file1['path'] == file2['path'] or file2['path'] in processed:
-                    continue
-                
-                # 计算dhash距离
-                dhash_distance = hamming_distance(file1['dhash'], file2['dhash'])
-                
-                # 计算phash距离
-                phash_distance = hamming_distance(file1['phash'], file2['phash'])
-                
-                # 计算ahash距离
-                ahash_distance = hamming_distance(file1['ahash'], file2['ahash'])
-                
-                # 判断是否相似 - 使用多重验证机制，至少两种算法都判断为相似
-                dhash_similar = dhash_distance < self.dhash_threshold
-                phash_similar = phash_distance < self.phash_threshold
-                ahash_similar = ahash_distance < self.ahash_threshold
-                
-                # 计算相似的算法数量
-                similar_count = sum([dhash_similar, phash_similar, ahash_similar])
-                
-                # 至少需要两种算法都判断为相似才认为是重复
-                if similar_count >= 2:
-                    similar_files.append({
-                        'path': file2['path'],
-                        'dhash_distance': dhash_distance,
-                        'phash_distance': phash_distance,
-                        'ahash_distance': ahash_distance
-                    })
-                    # 确定主要原因
-                    reasons = []
-                    if dhash_similar:
-                        reasons.append("dHash")
-                    if phash_similar:
-                        reasons.append("pHash")
-                    if ahash_similar:
-                        reasons.append("aHash")
-                    reason = "+".join(reasons) + "相似"
-            
-            if similar_files:
-                # 构建文件列表，包含哈希距离信息
-                files_with_distances = [{
-                    'path': file1['path'],
-                    'dhash_distance': 0,  # 基准文件距离为0
-                    'phash_distance': 0,
-                    'ahash_distance': 0
-                }]
-                files_with_distances.extend(similar_files)
-                
-                similar_group = {
-                    'reason': reason,
-                    'files': [item['path'] for item in files_with_distances],  # 保持向后兼容
-                    'files_with_distances': files_with_distances  # 新增：包含距离信息的文件列表
-                }
-                similar_groups.append(similar_group)
-                
-                # 标记为已处理
-                processed.add(file1['path'])
-                for file_info in similar_files:
-                    processed.add(file_info['path'])
+            similar_group = {
+                'reason': pair_reasons[dsu.find(anchor)].most_common(1)[0][0],  # 组内出现最多的相似原因
+                'files': [item['path'] for item in files_with_distances],  # 保持向后兼容
+                'files_with_distances': files_with_distances  # 新增：包含距离信息的文件列表
+            }
+            similar_groups.append(similar_group)
         
         # 更新统计信息
         self.phash_groups = similar_groups
@@ -344,12 +720,20 @@ class DuplicateChecker:
         """
         start_time = time.time()
         
-        # 扫描目录获取所有图片文件
+        # 扫描目录获取所有图片文件，边遍历边读取和解码，每个文件只处理一次
         self.log(f"正在扫描目录: {directory}")
-        image_files = self.scan_directory(directory, recursive)
-        self.log(f"找到 {len(image_files)} 个图片文件")
+        scanned = self.scan_directory(directory, recursive)
+        self.stats['total_images'] = 0
+        self.image_records = {}
+        self.image_errors = {}
         
-        self.stats['total_images'] = len(image_files)
+        def stream_files():
+            for file_path in scanned:
+                self.stats['total_images'] += 1
+                yield file_path
+        
+        image_files = self.analyze_images(stream_files())
+        self.log(f"找到 {len(image_files)} 个图片文件")
         
         # 步骤1: 检查完全相同的重复图片
         self.log("\n步骤1: 检查完全相同的重复图片")
@@ -368,13 +752,14 @@ class DuplicateChecker:
             if file_path not in processed_files:
                 unique_images.append(file_path)
         
-        # 步骤2: 检测纯色图片
+        # 步骤2: 检测纯色图片，纯色标记已在读取图片时得出，这里只汇总
         self.log(f"\n步骤2: 检测纯色图片 (共 {len(unique_images)} 个唯一文件)")
         pure_color_images = self.check_pure_color_images(unique_images)
         
         # 从图片列表中移除纯色图片
         if pure_color_images:
-            unique_images = [img for img in unique_images if img not in set(pure_color_images)]
+            pure_color_set = set(pure_color_images)
+            unique_images = [img for img in unique_images if img not in pure_color_set]
         
         # 步骤3: 检查感知上相似的图片
         self.log(f"\n步骤3: 检查感知上相似的图片 (共 {len(unique_images)} 个唯一文件)")
@@ -418,6 +803,11 @@ class DuplicateChecker:
         else:
             self.log("\n未发现重复图片")
         
+        # 清理扫描目录下已删除或已修改文件的缓存记录，然后关闭缓存数据库（再次查重时自动重新打开）
+        if self.cache is not None:
+            self.cache.prune(directory)
+            self.cache.close()
+        
         end_time = time.time()
         elapsed_time = end_time - start_time
         
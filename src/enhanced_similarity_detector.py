@@ -6,12 +6,302 @@
 结合多种哈希算法和多尺度分析提高检测精度
 """
 
+import functools
 import os
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import List, Dict, Tuple, Optional
 from PIL import Image
 import numpy as np
-from .hash_utils import calculate_dhash, calculate_phash, calculate_ahash, hamming_distance
+from .hash_utils import _bits_to_hex, _median
+from .hamming import PROCESS_CONTEXT, find_similar_pairs_multi_index, hex_to_uint64, popcount64, popcount_xor
+from .hash_cache import HashCache
+from .hash_kernels import MAX_KERNEL_BITS, ahash_u64, dhash_u64, entropy_u8
+
+# 可选依赖：SciPy，提供基于FFT的DCT
+try:
+    from scipy.fft import dct as _scipy_dct
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# 多尺度哈希比较的哈希字段，决定打包数组的列顺序
+MULTI_SCALE_HASH_KEYS = ('dhash', 'phash', 'ahash')
+
+# 哈希计算失败或哈希大小不同时使用的距离
+INVALID_HASH_DISTANCE = 999
+
+# 特征相似度使用的特征及其权重（对比度和亮度权重较高）
+FEATURE_KEYS = ('aspect_ratio', 'brightness', 'contrast', 'entropy', 'edge_density')
+FEATURE_WEIGHTS = (0.15, 0.25, 0.25, 0.2, 0.15)
+
+# 除宽高比外各特征差值的归一化尺度
+FEATURE_SCALES = (255.0, 128.0, 8.0, 100.0)
+
+# 缩放到哈希像素块（不超过hash_size * 4见方）时使用的重采样滤波器：目标极小时盒式平均
+# 与LANCZOS效果相当，而每个输出像素覆盖的源像素少得多
+HASH_RESAMPLE = Image.BOX
+
+# 缩放变体不从原图缩放，而是先把灰度原图按整数倍缩小为短边不小于此值的工作图；
+# JPEG解码时也直接缩小到短边不小于此值
+SCALE_WORKING_MIN_SIDE = 256
+
+# 进程内保留的最近计算的多尺度哈希数量，反复比较同一文件（如逐对调用compare_enhanced_similarity）时不重复解码
+MEMORY_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_basis(size: int) -> np.ndarray:
+    """
+    生成正交归一化的DCT-II基矩阵，与scipy.fft.dct(norm='ortho')的结果一致
+
+    Args:
+        size: 变换长度
+
+    Returns:
+        形状为(size, size)的float64矩阵，dct(x) = basis @ x
+    """
+    k = np.arange(size).reshape(-1, 1)
+    n = np.arange(size)
+    basis = np.cos(np.pi * k * (2 * n + 1) / (2 * size)) * np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    basis.setflags(write=False)
+    return basis
+
+
+def _dct_low_frequencies(pixels: np.ndarray, hash_size: int) -> np.ndarray:
+    """
+    计算二维DCT-II（正交归一化）并取左上角的低频部分
+
+    Args:
+        pixels: 形状为(N, N)的灰度像素
+        hash_size: 低频部分的边长
+
+    Returns:
+        形状为(hash_size, hash_size)的DCT系数
+    """
+    if HAS_SCIPY:
+        dct = _scipy_dct(_scipy_dct(pixels, axis=0, norm='ortho'), axis=1, norm='ortho')
+        return dct[:hash_size, :hash_size]
+    
+    # 未安装SciPy时只计算需要的低频行列：basis[:h] @ pixels @ basis[:h].T
+    basis = _dct_basis(pixels.shape[0])[:hash_size]
+    return basis @ pixels @ basis.T
+
+
+def _dhash8(pixels: np.ndarray) -> str:
+    """由9×8的灰度像素计算默认大小（8）的dHash，64位即16个十六进制字符"""
+    return '%016x' % dhash_u64(pixels)
+
+
+def _ahash8(pixels: np.ndarray) -> str:
+    """由8×8的灰度像素计算默认大小（8）的aHash，64位即16个十六进制字符"""
+    return '%016x' % ahash_u64(pixels)
+
+
+def _phash8(pixels: np.ndarray) -> str:
+    """由32×32的灰度像素计算默认大小（8）的pHash，63个系数的中值即第32小的值，取前60位即15个十六进制字符"""
+    dct_flat = _dct_low_frequencies(pixels.astype(np.float64), 8).ravel()[1:]
+    bits = dct_flat > np.partition(dct_flat, 31)[31]
+    return np.packbits(bits).tobytes().hex()[:15]
+
+
+def _rot90(pixels: np.ndarray, quarter_turns: int) -> np.ndarray:
+    """
+    与np.rot90(pixels, quarter_turns)相同，直接用切片实现以减少小数组上的调用开销
+
+    Args:
+        pixels: 二维数组
+        quarter_turns: 逆时针旋转90°的次数（0到3）
+
+    Returns:
+        旋转后的C连续数组
+    """
+    if quarter_turns == 1:
+        rotated = pixels[:, ::-1].T
+    elif quarter_turns == 2:
+        rotated = pixels[::-1, ::-1]
+    elif quarter_turns == 3:
+        rotated = pixels.T[:, ::-1]
+    else:
+        rotated = pixels
+    return np.ascontiguousarray(rotated)
+
+
+def _fits_kernel(hash_size: int) -> bool:
+    """
+    判断哈希是否可以由hash_kernels直接计算为整数：不超过64位且位数为4的倍数
+
+    Args:
+        hash_size: 哈希大小
+
+    Returns:
+        可以使用内核时返回True
+    """
+    return hash_size * hash_size <= MAX_KERNEL_BITS and hash_size % 2 == 0
+
+
+def _pack_multi_scale_hashes(hashes: List[Dict]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    将一张图片的多尺度哈希打包为uint64数组，用于向量化比较
+
+    Args:
+        hashes: calculate_multi_scale_hashes返回的哈希列表
+
+    Returns:
+        (哈希数组, 有效标记, 哈希大小)，形状分别为(N, 3, W)、(N, 3)和(N,)，
+        超过64位的哈希按低位在前拆分为W个uint64
+    """
+    words = max([(hash_data['hash_size'] ** 2 + 63) // 64 for hash_data in hashes] or [1])
+    packed = np.zeros((len(hashes), len(MULTI_SCALE_HASH_KEYS), words), dtype=np.uint64)
+    valid = np.zeros((len(hashes), len(MULTI_SCALE_HASH_KEYS)), dtype=bool)
+    
+    for i, hash_data in enumerate(hashes):
+        for k, key in enumerate(MULTI_SCALE_HASH_KEYS):
+            value = hash_data.get(key + '_u64')
+            if value is None:
+                continue
+            valid[i, k] = True
+            for w in range(words):
+                packed[i, k, w] = (value >> (64 * w)) & 0xFFFFFFFFFFFFFFFF
+    
+    sizes = np.array([hash_data['hash_size'] for hash_data in hashes], dtype=np.int64)
+    return packed, valid, sizes
+
+
+def _multi_scale_distances(packed1: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                           packed2: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    一次计算两张图片所有多尺度哈希组合之间的汉明距离
+
+    Args:
+        packed1: 第一张图片_pack_multi_scale_hashes的结果
+        packed2: 第二张图片_pack_multi_scale_hashes的结果
+
+    Returns:
+        形状为(N1, N2, 3)的距离数组，哈希无效或哈希大小不同时为INVALID_HASH_DISTANCE
+    """
+    hashes1, valid1, sizes1 = packed1
+    hashes2, valid2, sizes2 = packed2
+    
+    # 字数不同时补零对齐，不同大小的哈希组合最终会被标记为无效
+    words = max(hashes1.shape[2], hashes2.shape[2])
+    if hashes1.shape[2] < words:
+        hashes1 = np.pad(hashes1, ((0, 0), (0, 0), (0, words - hashes1.shape[2])))
+    if hashes2.shape[2] < words:
+        hashes2 = np.pad(hashes2, ((0, 0), (0, 0), (0, words - hashes2.shape[2])))
+    
+    distances = popcount64(hashes1[:, None] ^ hashes2[None, :]).sum(axis=-1, dtype=np.int64)
+    comparable = valid1[:, None] & valid2[None, :] & (sizes1[:, None] == sizes2[None, :])[:, :, None]
+    return np.where(comparable, distances, INVALID_HASH_DISTANCE)
+
+
+def _restore_cached_hashes(hashes: List[Dict]) -> List[Dict]:
+    """
+    将从缓存（JSON）读取的多尺度哈希恢复为calculate_multi_scale_hashes返回的形式
+
+    Args:
+        hashes: 缓存中的哈希列表
+
+    Returns:
+        哈希列表，image_size恢复为元组
+    """
+    for hash_data in hashes:
+        hash_data['image_size'] = tuple(hash_data['image_size'])
+    return hashes
+
+
+def _candidate_neighbors(hashes_per_file: List[List[Dict]], thresholds: Tuple[int, int, int]) -> List[set]:
+    """
+    用所有文件的全部多尺度哈希组合建立索引，找出可能相似的文件对
+    
+    快速比较要求某个组合对的三种哈希中至少两种不超过阈值，任何组合对都达不到两票的
+    文件对不可能相似，可以直接跳过。超过64位的哈希不建立索引，含有这类哈希的文件与所有文件比较
+    
+    Args:
+        hashes_per_file: 与文件列表一一对应的多尺度哈希列表
+        thresholds: (dHash阈值, pHash阈值, aHash阈值)，距离不超过阈值视为相似
+        
+    Returns:
+        与文件列表一一对应的候选文件索引集合
+    """
+    n = len(hashes_per_file)
+    neighbors = [set() for _ in range(n)]
+    unindexed = set()
+    entries_by_size = {}
+    
+    for index, hashes in enumerate(hashes_per_file):
+        for hash_data in hashes:
+            values = [hash_data.get(key + '_u64') for key in MULTI_SCALE_HASH_KEYS]
+            if hash_data['hash_size'] ** 2 > MAX_KERNEL_BITS:
+                if any(value is not None for value in values):
+                    unindexed.add(index)
+                continue
+            entries_by_size.setdefault(hash_data['hash_size'], []).append((index, values))
+    
+    # 不同大小的哈希不可比较，分别查找；查找函数的阈值为严格小于
+    limits = [threshold + 1 for threshold in thresholds]
+    for entries in entries_by_size.values():
+        owners = np.array([index for index, _ in entries], dtype=np.int64)
+        hashes = np.array([[value or 0 for value in values] for _, values in entries], dtype=np.uint64)
+        valid = np.array([[value is not None for value in values] for _, values in entries], dtype=bool)
+        
+        for i, j, _ in find_similar_pairs_multi_index(hashes, valid, limits):
+            a, b = int(owners[i]), int(owners[j])
+            if a != b:
+                neighbors[a].add(b)
+                neighbors[b].add(a)
+    
+    for index in unindexed:
+        neighbors[index].update(range(n))
+        neighbors[index].discard(index)
+        for other in range(n):
+            if other != index:
+                neighbors[other].add(index)
+    
+    return neighbors
+
+
+def _stack_features(hashes: List[Dict]) -> np.ndarray:
+    """
+    将多尺度哈希中的特征字典按FEATURE_KEYS的顺序堆叠为数组
+
+    Args:
+        hashes: calculate_multi_scale_hashes返回的哈希列表
+
+    Returns:
+        形状为(N, 5)的float64数组
+    """
+    return np.array([[hash_data['features'][key] for key in FEATURE_KEYS] for hash_data in hashes],
+                    dtype=np.float64).reshape(len(hashes), len(FEATURE_KEYS))
+
+
+def _feature_similarity_matrix(features1: np.ndarray, features2: np.ndarray) -> np.ndarray:
+    """
+    批量计算两组特征之间的加权相似度，与_calculate_feature_similarity逐对计算的结果相同
+
+    Args:
+        features1: 形状为(N1, 5)的特征数组
+        features2: 形状为(N2, 5)的特征数组
+
+    Returns:
+        形状为(N1, N2)的特征相似度（0-1之间，1表示完全相似）
+    """
+    f1 = features1[:, None, :]
+    f2 = features2[None, :, :]
+    diff = np.abs(f1 - f2)
+    aspect_ratio = np.maximum(f1[..., 0], f2[..., 0])
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = [diff[..., 0] / aspect_ratio] + [diff[..., k + 1] / scale for k, scale in enumerate(FEATURE_SCALES)]
+    
+    # 按原来的顺序逐项累加，保证与逐对计算的浮点结果一致
+    similarity = 0.0
+    for weight, ratio in zip(FEATURE_WEIGHTS, ratios):
+        similarity = similarity + weight * (1.0 - np.minimum(ratio, 1.0))
+    
+    # 宽高比为0时逐对计算会因除零返回0
+    return np.where(aspect_ratio > 0, similarity, 0.0)
 
 
 class EnhancedSimilarityDetector:
@@ -23,7 +313,8 @@ class EnhancedSimilarityDetector:
     def __init__(self, 
                  angles: List[int] = None,
                  scales: List[float] = None,
-                 hash_sizes: List[int] = None):
+                 hash_sizes: List[int] = None,
+                 cache: Optional[HashCache] = None):
         """
         初始化增强相似度检测器
         
@@ -31,11 +322,19 @@ class EnhancedSimilarityDetector:
             angles: 要检测的旋转角度列表，默认为[0, 90, 180, 270]
             scales: 要检测的缩放比例列表，默认为[0.5, 0.75, 1.0, 1.25, 1.5]
             hash_sizes: 哈希大小列表，用于多尺度分析，默认为[8, 16]
+            cache: 哈希缓存，提供时未修改文件的多尺度哈希直接从缓存读取，默认为None
         """
         # 优化默认参数以提高性能
         self.angles = angles or [0, 90, 180, 270]  # 保持旋转检测
         self.scales = scales or [0.75, 1.0, 1.25]  # 减少缩放比例
         self.hash_sizes = hash_sizes or [8]  # 只使用一个哈希大小
+        self.cache = cache
+    
+    @property
+    def cache_kind(self) -> str:
+        """缓存结果类型，角度、缩放比例或哈希大小不同的结果分开存储"""
+        return "multi_scale:{}:{}:{}".format(*(",".join(map(str, values))
+                                               for values in (self.angles, self.scales, self.hash_sizes)))
     
     def calculate_multi_scale_hashes(self, image_path: str) -> List[Dict]:
         """
@@ -47,46 +346,103 @@ class EnhancedSimilarityDetector:
         Returns:
             包含多个角度和尺度哈希值的列表
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"文件不存在: {image_path}")
+        try:
+            stat = os.stat(image_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {image_path}") from None
+        if self.cache is not None:
+            cached = self.cache.get(image_path, self.cache_kind, stat)
+            if cached is not None:
+                return _restore_cached_hashes(cached)
         
+        # 内存缓存中的字典被所有调用方共享，返回副本，避免调用方修改结果后污染缓存
+        memoized = _memoized_multi_scale_hashes(image_path, stat.st_mtime_ns, stat.st_size,
+                                                tuple(self.angles), tuple(self.scales), tuple(self.hash_sizes))
+        all_hashes = [{**h, 'features': dict(h['features'])} for h in memoized]
+        if self.cache is not None:
+            self.cache.set(image_path, self.cache_kind, stat, all_hashes)
+        return all_hashes
+    
+    def _compute_multi_scale_hashes(self, image_path: str) -> List[Dict]:
+        """计算图片在多个角度和尺度下的哈希值，不使用缓存"""
         all_hashes = []
         
         try:
             img = Image.open(image_path)
             original_size = img.size
             
+            # 可以至少缩小一半的JPEG由libjpeg在DCT域按1/2、1/4、1/8直接解码为较小的灰度图，其他格式不受影响
+            short_side = min(original_size)
+            if short_side >= 2 * SCALE_WORKING_MIN_SIDE:
+                img.draft('L', (original_size[0] * SCALE_WORKING_MIN_SIDE // short_side,
+                                original_size[1] * SCALE_WORKING_MIN_SIDE // short_side))
+            # 解码后像素与原图尺寸之比，记录的图片尺寸仍按原图计算
+            draft_ratio = original_size[0] / img.size[0]
+            gray = img.convert('L')
+            working_gray = None
+            
+            # 亮度、对比度、熵和边缘密度对90°旋转和等比缩放基本不变，只从原图计算一次
+            base_features = self._extract_additional_features(gray)
+            
+            # 90°倍数的旋转不旋转原图，而是由未旋转图片缩放后的小像素块旋转得到，按尺度缓存
+            rotation_pixels = {}
+            
             for angle in self.angles:
+                quarter_turns = angle // 90 % 4 if angle % 90 == 0 else None
+                
                 # 旋转图片
-                if angle == 0:
+                if angle == 0 or quarter_turns is not None:
                     rotated_img = img
+                    rotated_size = original_size
                 else:
                     rotated_img = img.rotate(angle, expand=True, fillcolor='white')
+                    rotated_size = (rotated_img.size[0] * draft_ratio, rotated_img.size[1] * draft_ratio)
                 
                 for scale in self.scales:
                     # 缩放图片
-                    if scale == 1.0:
-                        scaled_img = rotated_img
+                    new_size = (int(rotated_size[0] * scale), 
+                               int(rotated_size[1] * scale))
+                    if new_size[0] <= 0 or new_size[1] <= 0:
+                        continue
+                    
+                    if quarter_turns is not None:
+                        if scale not in rotation_pixels:
+                            # 每个尺度只缩放一次灰度图，各角度和哈希共用；缩放变体在小得多的工作图上缩放
+                            if scale == 1.0:
+                                gray_img = gray
+                            else:
+                                if working_gray is None:
+                                    working_gray = self._working_gray(gray)
+                                gray_img = working_gray.resize((max(1, int(working_gray.size[0] * scale)),
+                                                                max(1, int(working_gray.size[1] * scale))), Image.LANCZOS)
+                            rotation_pixels[scale] = {
+                                hash_size: self._resize_for_hashes(gray_img, hash_size)
+                                for hash_size in self.hash_sizes
+                            }
+                        if quarter_turns % 2:
+                            new_size = (new_size[1], new_size[0])
                     else:
-                        new_size = (int(rotated_img.size[0] * scale), 
-                                   int(rotated_img.size[1] * scale))
-                        if new_size[0] > 0 and new_size[1] > 0:
-                            scaled_img = rotated_img.resize(new_size, Image.LANCZOS)
-                        else:
-                            continue
+                        scaled_img = rotated_img if scale == 1.0 else rotated_img.resize(
+                            (max(1, int(rotated_img.size[0] * scale)), max(1, int(rotated_img.size[1] * scale))), Image.LANCZOS)
+                        gray_img = scaled_img.convert('L')
+                    
+                    # 只有宽高比随旋转变化
+                    width, height = new_size
+                    features = {**base_features, 'aspect_ratio': width / height if height > 0 else 1.0}
                     
                     # 为每个哈希大小计算哈希值（优化：直接从PIL图像计算）
                     for hash_size in self.hash_sizes:
                         try:
-                            # 直接从PIL图像计算哈希值，避免临时文件
-                            dhash = self._calculate_dhash_from_image(scaled_img, hash_size)
-                            phash = self._calculate_phash_from_image(scaled_img, hash_size)
-                            ahash = self._calculate_ahash_from_image(scaled_img, hash_size)
-                            
-                            # 计算额外的特征
-                            features = self._extract_additional_features(scaled_img)
+                            if quarter_turns is not None:
+                                dhash, phash, ahash = self._hashes_from_rotated_pixels(
+                                    rotation_pixels[scale][hash_size], quarter_turns, hash_size)
+                            else:
+                                # 直接从PIL图像计算哈希值，避免临时文件
+                                dhash = self._calculate_dhash_from_image(gray_img, hash_size)
+                                phash = self._calculate_phash_from_image(gray_img, hash_size)
+                                ahash = self._calculate_ahash_from_image(gray_img, hash_size)
                             
-                            all_hashes.append({
+                            hash_data = {
                                 'angle': angle,
                                 'scale': scale,
                                 'hash_size': hash_size,
@@ -94,8 +450,15 @@ class EnhancedSimilarityDetector:
                                 'phash': phash,
                                 'ahash': ahash,
                                 'features': features,
-                                'image_size': scaled_img.size
-                            })
+                                'image_size': new_size
+                            }
+                            
+                            # 同时保存整数形式的哈希，比较时直接异或后计数，计算失败时为None
+                            for key in ('dhash', 'phash', 'ahash'):
+                                value, ok = hex_to_uint64(hash_data[key])
+                                hash_data[key + '_u64'] = value if ok else None
+                            
+                            all_hashes.append(hash_data)
                         except Exception as e:
                             # 如果计算失败，跳过这个组合
                             continue
@@ -105,123 +468,152 @@ class EnhancedSimilarityDetector:
         
         return all_hashes
     
+    def _working_gray(self, gray: Image.Image) -> Image.Image:
+        """
+        按整数倍（盒式平均）缩小灰度原图，作为缩放变体的输入
+        
+        缩放变体最终只需要hash_size * 4像素见方的像素块，在全分辨率原图上做LANCZOS缩放
+        的开销与原图面积成正比，先缩小到短边不小于SCALE_WORKING_MIN_SIDE可避免这部分开销
+        
+        Args:
+            gray: 灰度原图
+            
+        Returns:
+            工作图，原图较小时为原图本身
+        """
+        factor = min(gray.size) // SCALE_WORKING_MIN_SIDE
+        return gray.reduce(factor) if factor > 1 else gray
+    
+    def _resize_for_hashes(self, gray_img: Image.Image, hash_size: int) -> Dict[str, np.ndarray]:
+        """
+        将未旋转的灰度图缩放为各哈希所需的像素块，供所有90°倍数的角度共用
+        
+        Args:
+            gray_img: 灰度图
+            hash_size: 哈希大小
+            
+        Returns:
+            'dhash'、'dhash_transposed'（旋转90°/270°后使用）、'phash'、'ahash'像素块
+        """
+        return {
+            'dhash': np.array(gray_img.resize((hash_size + 1, hash_size), HASH_RESAMPLE)),
+            'dhash_transposed': np.array(gray_img.resize((hash_size, hash_size + 1), HASH_RESAMPLE)),
+            'phash': np.array(gray_img.resize((hash_size * 4, hash_size * 4), HASH_RESAMPLE)),
+            'ahash': np.array(gray_img.resize((hash_size, hash_size), HASH_RESAMPLE))
+        }
+    
+    def _hashes_from_rotated_pixels(self, pixels: Dict[str, np.ndarray], quarter_turns: int,
+                                    hash_size: int) -> Tuple[str, str, str]:
+        """
+        将缩放后的像素块逆时针旋转quarter_turns个90°后计算三种哈希，与先旋转原图再缩放等价
+        
+        Args:
+            pixels: _resize_for_hashes的结果
+            quarter_turns: 逆时针旋转90°的次数
+            hash_size: 哈希大小
+            
+        Returns:
+            (dHash, pHash, aHash)
+        """
+        def rotate(key):
+            return _rot90(pixels[key], quarter_turns)
+        
+        dhash_key = 'dhash_transposed' if quarter_turns % 2 else 'dhash'
+        return (
+            self._dhash_from_pixels(rotate(dhash_key), hash_size),
+            self._phash_from_pixels(rotate('phash'), hash_size),
+            self._ahash_from_pixels(rotate('ahash'), hash_size)
+        )
+    
+    def _dhash_from_pixels(self, pixels: np.ndarray, hash_size: int) -> str:
+        """由缩放为(hash_size, hash_size + 1)的灰度像素计算dHash"""
+        try:
+            if hash_size == 8:
+                return _dhash8(pixels)
+            if _fits_kernel(hash_size):
+                return format(dhash_u64(pixels), f'0{hash_size * hash_size // 4}x')
+            diff = pixels[:, 1:] > pixels[:, :-1]
+            return _bits_to_hex(diff)
+        except Exception:
+            return "error"
+    
+    def _phash_from_pixels(self, pixels: np.ndarray, hash_size: int) -> str:
+        """由缩放为(hash_size * 4, hash_size * 4)的灰度像素计算pHash"""
+        try:
+            if hash_size == 8:
+                return _phash8(pixels)
+            # 二维DCT的低频部分，去掉直流分量
+            dct = _dct_low_frequencies(pixels.astype(np.float64), hash_size)
+            dct_flat = dct.flatten()[1:]
+            median = _median(dct_flat)
+            diff = dct_flat > median
+            return _bits_to_hex(diff)
+        except Exception:
+            return "error"
+    
+    def _ahash_from_pixels(self, pixels: np.ndarray, hash_size: int) -> str:
+        """由缩放为(hash_size, hash_size)的灰度像素计算aHash"""
+        try:
+            if hash_size == 8:
+                return _ahash8(pixels)
+            if _fits_kernel(hash_size):
+                return format(ahash_u64(pixels), f'0{hash_size * hash_size // 4}x')
+            avg = np.mean(pixels)
+            diff = pixels > avg
+            return _bits_to_hex(diff)
+        except Exception:
+            return "error"
+    
     def _calculate_dhash_from_image(self, image: Image.Image, hash_size: int) -> str:
         """直接从PIL图像计算指定大小的dHash"""
         try:
-            gray_img = image.convert('L')
-            resized_img = gray_img.resize((hash_size + 1, hash_size), Image.LANCZOS)
-            pixels = np.array(resized_img)
-            diff = pixels[:, 1:] > pixels[:, :-1]
-            binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            gray_img = image if image.mode == 'L' else image.convert('L')
+            resized_img = gray_img.resize((hash_size + 1, hash_size), HASH_RESAMPLE)
         except Exception:
             return "error"
+        return self._dhash_from_pixels(np.array(resized_img), hash_size)
     
     def _calculate_phash_from_image(self, image: Image.Image, hash_size: int) -> str:
         """直接从PIL图像计算指定大小的pHash"""
         try:
-            gray_img = image.convert('L')
-            resized_img = gray_img.resize((hash_size * 4, hash_size * 4), Image.LANCZOS)
-            pixels = np.array(resized_img, dtype=np.float32)
-            
-            # 简化的DCT计算
-            dct = np.zeros((hash_size, hash_size))
-            for i in range(hash_size):
-                for j in range(hash_size):
-                    dct[i, j] = np.sum(pixels * 
-                                     np.cos(np.pi * i * np.arange(hash_size * 4) / (hash_size * 4)) *
-                                     np.cos(np.pi * j * np.arange(hash_size * 4).reshape(-1, 1) / (hash_size * 4)))
-            
-            dct_flat = dct.flatten()[1:]
-            median = np.median(dct_flat)
-            diff = dct_flat > median
-            binary_hash = ''.join('1' if d else '0' for d in diff)
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                if i + 4 <= len(binary_hash):
-                    hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            gray_img = image if image.mode == 'L' else image.convert('L')
+            resized_img = gray_img.resize((hash_size * 4, hash_size * 4), HASH_RESAMPLE)
         except Exception:
             return "error"
+        return self._phash_from_pixels(np.array(resized_img), hash_size)
     
     def _calculate_ahash_from_image(self, image: Image.Image, hash_size: int) -> str:
         """直接从PIL图像计算指定大小的aHash"""
         try:
-            gray_img = image.convert('L')
-            resized_img = gray_img.resize((hash_size, hash_size), Image.LANCZOS)
-            pixels = np.array(resized_img)
-            avg = np.mean(pixels)
-            diff = pixels > avg
-            binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                if i + 4 <= len(binary_hash):
-                    hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            gray_img = image if image.mode == 'L' else image.convert('L')
+            resized_img = gray_img.resize((hash_size, hash_size), HASH_RESAMPLE)
         except Exception:
             return "error"
+        return self._ahash_from_pixels(np.array(resized_img), hash_size)
     
     def _calculate_dhash_with_size(self, image_path: str, hash_size: int) -> str:
         """计算指定大小的dHash"""
         try:
-            image = Image.open(image_path).convert('L')
-            image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
-            pixels = np.array(image)
-            diff = pixels[:, 1:] > pixels[:, :-1]
-            binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            image = Image.open(image_path)
         except Exception:
             return "error"
+        return self._calculate_dhash_from_image(image, hash_size)
     
     def _calculate_phash_with_size(self, image_path: str, hash_size: int) -> str:
         """计算指定大小的pHash"""
         try:
-            image = Image.open(image_path).convert('L')
-            image = image.resize((hash_size * 4, hash_size * 4), Image.LANCZOS)
-            pixels = np.array(image, dtype=np.float32)
-            
-            # 简化的DCT计算
-            dct = np.zeros((hash_size, hash_size))
-            for i in range(hash_size):
-                for j in range(hash_size):
-                    dct[i, j] = np.sum(pixels * 
-                                     np.cos(np.pi * i * np.arange(hash_size * 4) / (hash_size * 4)) *
-                                     np.cos(np.pi * j * np.arange(hash_size * 4).reshape(-1, 1) / (hash_size * 4)))
-            
-            dct_flat = dct.flatten()[1:]
-            median = np.median(dct_flat)
-            diff = dct_flat > median
-            binary_hash = ''.join('1' if d else '0' for d in diff)
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                if i + 4 <= len(binary_hash):
-                    hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            image = Image.open(image_path)
         except Exception:
             return "error"
+        return self._calculate_phash_from_image(image, hash_size)
     
     def _calculate_ahash_with_size(self, image_path: str, hash_size: int) -> str:
         """计算指定大小的aHash"""
         try:
-            image = Image.open(image_path).convert('L')
-            image = image.resize((hash_size, hash_size), Image.LANCZOS)
-            pixels = np.array(image)
-            avg = np.mean(pixels)
-            diff = pixels > avg
-            binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
-            hex_hash = ''
-            for i in range(0, len(binary_hash), 4):
-                if i + 4 <= len(binary_hash):
-                    hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-            return hex_hash
+            image = Image.open(image_path)
         except Exception:
             return "error"
+        return self._calculate_ahash_from_image(image, hash_size)
     
     def _extract_additional_features(self, image: Image.Image) -> Dict:
         """
@@ -234,14 +626,15 @@ class EnhancedSimilarityDetector:
             特征字典
         """
         try:
-            # 转换为灰度图
-            gray_img = image.convert('L')
+            # 转换为灰度图（已是灰度图时直接使用）
+            gray_img = image if image.mode == 'L' else image.convert('L')
             pixels = np.array(gray_img)
             
             features = {
                 'aspect_ratio': image.size[0] / image.size[1] if image.size[1] > 0 else 1.0,
                 'brightness': np.mean(pixels),
-                'contrast': np.std(pixels),
+                # 以float32计算标准差：中间的去均值和平方数组内存减半，精度对特征比较足够
+                'contrast': float(np.std(pixels, dtype=np.float32)),
                 'entropy': self._calculate_entropy(pixels),
                 'edge_density': self._calculate_edge_density(pixels)
             }
@@ -259,6 +652,10 @@ class EnhancedSimilarityDetector:
     def _calculate_entropy(self, pixels: np.ndarray) -> float:
         """计算图片熵值"""
         try:
+            # uint8像素直接计数（熵与形状无关，展平为一行交给内核）
+            if pixels.dtype == np.uint8 and pixels.size > 0:
+                return entropy_u8(np.ascontiguousarray(pixels).reshape(1, -1))
+            
             hist, _ = np.histogram(pixels, bins=256, range=(0, 256))
             hist = hist / hist.sum()
             hist = hist[hist > 0]  # 移除零值
@@ -270,15 +667,16 @@ class EnhancedSimilarityDetector:
     def _calculate_edge_density(self, pixels: np.ndarray) -> float:
         """计算边缘密度"""
         try:
-            # 简单的Sobel边缘检测
-            sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
-            sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+            # 二维3x3 Sobel边缘检测，边界按镜像（不含边缘像素）填充，与OpenCV默认一致
+            padded = np.pad(pixels.astype(np.float32), 1, mode='reflect')
             
-            # 计算梯度
-            grad_x = np.abs(np.convolve(pixels.flatten(), sobel_x.flatten(), mode='same'))
-            grad_y = np.abs(np.convolve(pixels.flatten(), sobel_y.flatten(), mode='same'))
+            # Sobel核可分离：先沿一个方向做[1, 2, 1]平滑，再沿另一个方向做[-1, 0, 1]差分
+            smooth_y = padded[:-2] + 2 * padded[1:-1] + padded[2:]
+            grad_x = smooth_y[:, 2:] - smooth_y[:, :-2]
+            smooth_x = padded[:, :-2] + 2 * padded[:, 1:-1] + padded[:, 2:]
+            grad_y = smooth_x[2:] - smooth_x[:-2]
             
-            edge_magnitude = np.sqrt(grad_x**2 + grad_y**2)
+            edge_magnitude = np.hypot(grad_x, grad_y)
             edge_density = np.mean(edge_magnitude)
             
             return float(edge_density)
@@ -309,71 +707,58 @@ class EnhancedSimilarityDetector:
         hashes1 = self.calculate_multi_scale_hashes(image1_path)
         hashes2 = self.calculate_multi_scale_hashes(image2_path)
         
-        best_match = None
         min_distances = {
             'dhash': float('inf'),
             'phash': float('inf'),
             'ahash': float('inf')
         }
         
-        all_matches = []
+        top_matches = []
         
-        # 比较所有组合
-        for h1 in hashes1:
-            for h2 in hashes2:
-                if (h1['dhash'] == "error" or h2['dhash'] == "error" or
-                    h1['phash'] == "error" or h2['phash'] == "error" or
-                    h1['ahash'] == "error" or h2['ahash'] == "error"):
-                    continue
-                
-                try:
-                    # 计算哈希距离
-                    dhash_dist = hamming_distance(h1['dhash'], h2['dhash'])
-                    phash_dist = hamming_distance(h1['phash'], h2['phash'])
-                    ahash_dist = hamming_distance(h1['ahash'], h2['ahash'])
-                    
-                    # 计算特征相似度
-                    feature_similarity = self._calculate_feature_similarity(h1['features'], h2['features'])
-                    
-                    # 综合评分（哈希距离越小越好，特征相似度越大越好）
-                    hash_score = (dhash_dist + phash_dist + ahash_dist) / 3.0
-                    feature_score = (1.0 - feature_similarity) * 64  # 转换为距离形式
-                    combined_score = hash_score * (1 - feature_weight) + feature_score * feature_weight
-                    
-                    match_info = {
-                        'angle1': h1['angle'],
-                        'angle2': h2['angle'],
-                        'scale1': h1['scale'],
-                        'scale2': h2['scale'],
-                        'hash_size': h1['hash_size'],
-                        'dhash_distance': dhash_dist,
-                        'phash_distance': phash_dist,
-                        'ahash_distance': ahash_dist,
-                        'feature_similarity': feature_similarity,
-                        'combined_score': combined_score,
-                        'size1': h1['image_size'],
-                        'size2': h2['image_size']
-                    }
-                    
-                    all_matches.append(match_info)
-                    
-                    # 更新最小距离
-                    if dhash_dist < min_distances['dhash']:
-                        min_distances['dhash'] = dhash_dist
-                    if phash_dist < min_distances['phash']:
-                        min_distances['phash'] = phash_dist
-                    if ahash_dist < min_distances['ahash']:
-                        min_distances['ahash'] = ahash_dist
-                    
-                    # 更新最佳匹配
-                    if best_match is None or combined_score < best_match['combined_score']:
-                        best_match = match_info
-                
-                except Exception:
-                    continue
+        # 跳过任一哈希计算失败的组合，其余组合一次批量计算
+        hashes1 = [h for h in hashes1 if all(h[key] != "error" for key in MULTI_SCALE_HASH_KEYS)]
+        hashes2 = [h for h in hashes2 if all(h[key] != "error" for key in MULTI_SCALE_HASH_KEYS)]
         
-        # 排序所有匹配结果
-        all_matches.sort(key=lambda x: x['combined_score'])
+        if hashes1 and hashes2:
+            packed1 = _pack_multi_scale_hashes(hashes1)
+            packed2 = _pack_multi_scale_hashes(hashes2)
+            distances = _multi_scale_distances(packed1, packed2)
+            feature_similarity = _feature_similarity_matrix(_stack_features(hashes1), _stack_features(hashes2))
+            
+            # 综合评分（哈希距离越小越好，特征相似度越大越好）
+            hash_score = distances.sum(axis=-1) / 3.0
+            feature_score = (1.0 - feature_similarity) * 64  # 转换为距离形式
+            combined_score = hash_score * (1 - feature_weight) + feature_score * feature_weight
+            
+            # 只比较哈希大小相同的组合，按评分稳定排序（评分相同时保持遍历顺序）
+            comparable = np.flatnonzero((packed1[2][:, None] == packed2[2][None, :]).ravel())
+            order = comparable[np.argsort(combined_score.ravel()[comparable], kind='stable')]
+            
+            if len(comparable):
+                flat_distances = distances.reshape(-1, len(MULTI_SCALE_HASH_KEYS))[comparable]
+                for k, key in enumerate(MULTI_SCALE_HASH_KEYS):
+                    min_distances[key] = int(flat_distances[:, k].min())
+            
+            for index in order[:5]:
+                i, j = divmod(int(index), len(hashes2))
+                h1, h2 = hashes1[i], hashes2[j]
+                top_matches.append({
+                    'angle1': h1['angle'],
+                    'angle2': h2['angle'],
+                    'scale1': h1['scale'],
+                    'scale2': h2['scale'],
+                    'hash_size': h1['hash_size'],
+                    'dhash_distance': int(distances[i, j, 0]),
+                    'phash_distance': int(distances[i, j, 1]),
+                    'ahash_distance': int(distances[i, j, 2]),
+                    'feature_similarity': float(feature_similarity[i, j]),
+                    'combined_score': float(combined_score[i, j]),
+                    'size1': h1['image_size'],
+                    'size2': h2['image_size']
+                })
+        
+        # 最佳匹配为评分最低的组合
+        best_match = top_matches[0] if top_matches else None
         
         # 判断相似度
         dhash_similar = min_distances['dhash'] <= dhash_threshold
@@ -397,7 +782,7 @@ class EnhancedSimilarityDetector:
             'detection_type': detection_type,
             'min_distances': min_distances,
             'best_match': best_match,
-            'top_matches': all_matches[:5],  # 返回前5个最佳匹配
+            'top_matches': top_matches,  # 返回前5个最佳匹配
             'similar_algorithms': {
                 'dhash': dhash_similar,
                 'phash': phash_similar,
@@ -501,24 +886,29 @@ class EnhancedSimilarityDetector:
         except Exception:
             return 0.0
     
-    def _hamming_distance(self, hash1: str, hash2: str) -> int:
+    def _hamming_distance(self, hash1, hash2) -> int:
         """
-        计算两个哈希值的汉明距离
+        计算两个哈希值的汉明距离（不同的位数）
         
         Args:
-            hash1: 第一个哈希值
+            hash1: 第一个哈希值，整数或十六进制字符串，计算失败的哈希为None或"error"
             hash2: 第二个哈希值
             
         Returns:
-            汉明距离
+            汉明距离，任一哈希无效或长度不同时返回999
         """
-        if hash1 == "error" or hash2 == "error" or len(hash1) != len(hash2):
-            return 999  # 返回一个很大的距离值
+        if isinstance(hash1, str) or isinstance(hash2, str):
+            if hash1 == "error" or hash2 == "error" or len(hash1) != len(hash2):
+                return 999  # 返回一个很大的距离值
+            try:
+                hash1, hash2 = int(hash1, 16), int(hash2, 16)
+            except (TypeError, ValueError):
+                return 999
         
-        try:
-            return sum(c1 != c2 for c1, c2 in zip(hash1, hash2))
-        except Exception:
+        if hash1 is None or hash2 is None:
             return 999
+        
+        return popcount_xor(int(hash1), int(hash2))
     
     def _calculate_feature_similarity_from_dict(self, features1: Dict, features2: Dict) -> float:
         """
@@ -552,7 +942,9 @@ class EnhancedSimilarityDetector:
                                             dhash_threshold: int = 12,
                                             phash_threshold: int = 4,
                                             ahash_threshold: int = 4,
-                                            feature_weight: float = 0.3) -> Dict:
+                                            feature_weight: float = 0.3,
+                                            packed1: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                                            packed2: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Dict:
         """
         使用预计算的哈希值进行快速比较
         
@@ -565,6 +957,8 @@ class EnhancedSimilarityDetector:
             phash_threshold: pHash阈值
             ahash_threshold: aHash阈值
             feature_weight: 特征权重
+            packed1: 第一个图片_pack_multi_scale_hashes的结果，批量比较时预先打包可避免重复转换
+            packed2: 第二个图片_pack_multi_scale_hashes的结果
             
         Returns:
             比较结果字典
@@ -572,64 +966,50 @@ class EnhancedSimilarityDetector:
         if not hashes1 or not hashes2:
             return None
         
-        best_similarity = 0
         best_match = None
         best_rotation = 0
         best_scale = 1.0
+        
+        # 一次计算所有哈希组合的距离，形状为(N1, N2, 3)
+        distances = _multi_scale_distances(packed1 or _pack_multi_scale_hashes(hashes1),
+                                           packed2 or _pack_multi_scale_hashes(hashes2))
+        dhash_dist, phash_dist, ahash_dist = distances[..., 0], distances[..., 1], distances[..., 2]
         min_distances = {
-            'dhash': float('inf'),
-            'phash': float('inf'),
-            'ahash': float('inf')
+            'dhash': int(dhash_dist.min()),
+            'phash': int(phash_dist.min()),
+            'ahash': int(ahash_dist.min())
         }
         
-        # 快速比较所有哈希组合
-        for hash_data1 in hashes1:
-            for hash_data2 in hashes2:
-                # 计算哈希距离
-                dhash_dist = self._hamming_distance(hash_data1['dhash'], hash_data2['dhash'])
-                phash_dist = self._hamming_distance(hash_data1['phash'], hash_data2['phash'])
-                ahash_dist = self._hamming_distance(hash_data1['ahash'], hash_data2['ahash'])
-                
-                # 更新最小距离
-                min_distances['dhash'] = min(min_distances['dhash'], dhash_dist)
-                min_distances['phash'] = min(min_distances['phash'], phash_dist)
-                min_distances['ahash'] = min(min_distances['ahash'], ahash_dist)
-                
-                # 检查是否满足阈值
-                hash_matches = 0
-                if dhash_dist <= dhash_threshold:
-                    hash_matches += 1
-                if phash_dist <= phash_threshold:
-                    hash_matches += 1
-                if ahash_dist <= ahash_threshold:
-                    hash_matches += 1
-                
-                # 至少需要2个哈希算法匹配
-                if hash_matches >= 2:
-                    # 计算相似度分数
-                    hash_similarity = 1.0 - (dhash_dist + phash_dist + ahash_dist) / (64 + 64 + 64)
-                    
-                    if hash_similarity > best_similarity:
-                         best_similarity = hash_similarity
-                         # 简化特征相似度计算
-                         feature_sim = 0.8  # 默认特征相似度
-                         if 'features' in hash_data1 and 'features' in hash_data2:
-                             try:
-                                 feature_sim = self._calculate_feature_similarity_from_dict(
-                                     hash_data1['features'], hash_data2['features']
-                                 )
-                             except:
-                                 feature_sim = 0.8
-                         
-                         best_match = {
-                             'dhash_distance': dhash_dist,
-                             'phash_distance': phash_dist,
-                             'ahash_distance': ahash_dist,
-                             'hash_similarity': hash_similarity,
-                             'feature_similarity': feature_sim
-                         }
-                         best_rotation = abs(hash_data1.get('angle', 0) - hash_data2.get('angle', 0))
-                         best_scale = max(hash_data1.get('scale', 1.0), hash_data2.get('scale', 1.0)) / min(hash_data1.get('scale', 1.0), hash_data2.get('scale', 1.0))
+        # 至少需要2个哈希算法匹配，取相似度分数最高的组合（相同分数时取第一个）
+        hash_matches = ((dhash_dist <= dhash_threshold).astype(np.int64) +
+                        (phash_dist <= phash_threshold) + (ahash_dist <= ahash_threshold))
+        hash_similarity = 1.0 - distances.sum(axis=-1) / (64 + 64 + 64)
+        candidates = (hash_matches >= 2) & (hash_similarity > 0)
+        
+        if candidates.any():
+            i, j = np.unravel_index(np.argmax(np.where(candidates, hash_similarity, -np.inf)), candidates.shape)
+            hash_data1, hash_data2 = hashes1[i], hashes2[j]
+            best_similarity = float(hash_similarity[i, j])
+            
+            # 简化特征相似度计算
+            feature_sim = 0.8  # 默认特征相似度
+            if 'features' in hash_data1 and 'features' in hash_data2:
+                try:
+                    feature_sim = self._calculate_feature_similarity_from_dict(
+                        hash_data1['features'], hash_data2['features']
+                    )
+                except:
+                    feature_sim = 0.8
+            
+            best_match = {
+                'dhash_distance': int(dhash_dist[i, j]),
+                'phash_distance': int(phash_dist[i, j]),
+                'ahash_distance': int(ahash_dist[i, j]),
+                'hash_similarity': best_similarity,
+                'feature_similarity': feature_sim
+            }
+            best_rotation = abs(hash_data1.get('angle', 0) - hash_data2.get('angle', 0))
+            best_scale = max(hash_data1.get('scale', 1.0), hash_data2.get('scale', 1.0)) / min(hash_data1.get('scale', 1.0), hash_data2.get('scale', 1.0))
         
         if best_match is None:
             return {
@@ -677,13 +1057,58 @@ class EnhancedSimilarityDetector:
         }
 
 
+@functools.lru_cache(maxsize=MEMORY_CACHE_SIZE)
+def _memoized_multi_scale_hashes(image_path: str, mtime_ns: int, size: int, angles: Tuple[int, ...],
+                                 scales: Tuple[float, ...], hash_sizes: Tuple[int, ...]) -> Tuple[Dict, ...]:
+    """
+    计算并在内存中缓存单个文件的多尺度哈希，修改时间和大小是键的一部分，文件修改后重新计算
+
+    Args:
+        image_path: 图片路径
+        mtime_ns: 文件修改时间（纳秒）
+        size: 文件大小
+        angles: 旋转角度
+        scales: 缩放比例
+        hash_sizes: 哈希大小
+
+    Returns:
+        多尺度哈希元组
+    """
+    detector = EnhancedSimilarityDetector(list(angles), list(scales), list(hash_sizes))
+    return tuple(detector._compute_multi_scale_hashes(image_path))
+
+
+def _precompute_one(file_path: str, angles: List[int], scales: List[float],
+                    hash_sizes: List[int]) -> Tuple[str, List[Dict], Optional[str]]:
+    """
+    在子进程中计算单个文件的多尺度哈希
+
+    Args:
+        file_path: 图片路径
+        angles: 旋转角度列表
+        scales: 缩放比例列表
+        hash_sizes: 哈希大小列表
+
+    Returns:
+        (文件路径, 多尺度哈希列表, 错误信息)，失败时哈希列表为空
+    """
+    try:
+        detector = EnhancedSimilarityDetector(angles, scales, hash_sizes)
+        return file_path, detector.calculate_multi_scale_hashes(file_path), None
+    except Exception as e:
+        return file_path, [], str(e)
+
+
 def batch_compare_with_enhanced_similarity(image_files: List[str],
                                          dhash_threshold: int = 12,
                                          phash_threshold: int = 4,
                                          ahash_threshold: int = 4,
                                          feature_weight: float = 0.3,
                                          confidence_threshold: float = 0.6,
-                                         log_callback=None) -> List[Dict]:
+                                         log_callback=None,
+                                         max_workers: Optional[int] = None,
+                                         cache: Optional[HashCache] = None,
+                                         verbose: bool = True) -> List[Dict]:
     """
     批量比较图片，支持旋转和分辨率变化检测（优化版本）
     
@@ -695,6 +1120,10 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
         feature_weight: 特征权重
         confidence_threshold: 置信度阈值
         log_callback: 日志回调函数
+        max_workers: 预计算哈希的进程数，默认为CPU核心数与需要计算的文件数中的较小值，为1时在当前进程中计算
+        cache: 哈希缓存，提供时跳过未修改文件的多尺度哈希计算，默认为None
+        verbose: 是否输出逐个文件和逐对比较的进度及匹配详情，为False时只输出阶段信息和错误，
+            也不再为这些日志格式化文件名和数值，默认为True
         
     Returns:
         相似图片组列表
@@ -702,7 +1131,7 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
     import time
     start_time = time.time()
     
-    detector = EnhancedSimilarityDetector()
+    detector = EnhancedSimilarityDetector(cache=cache)
     similar_groups = []
     processed = set()
     
@@ -722,17 +1151,66 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
     log("正在预计算所有图片的多尺度哈希值...")
     log(f"每个图片将计算 {len(detector.angles)} 个角度 × {len(detector.scales)} 个缩放 × {len(detector.hash_sizes)} 个哈希大小 = {len(detector.angles) * len(detector.scales) * len(detector.hash_sizes)} 个哈希组合")
     all_hashes = {}
-    for i, file_path in enumerate(image_files):
-        try:
-            # 更频繁的进度报告
-            log(f"预计算进度: {i+1}/{total_files} ({(i+1)/total_files*100:.1f}%) - 处理: {os.path.basename(file_path)}")
-            all_hashes[file_path] = detector.calculate_multi_scale_hashes(file_path)
-            log(f"  完成，生成了 {len(all_hashes[file_path])} 个哈希组合")
-        except Exception as e:
-            log(f"预计算哈希失败: {file_path}, 错误: {str(e)}")
-            all_hashes[file_path] = []
+    stats = {}
     
-    log("预计算完成，开始比较...")
+    # 日志中的文件名每个文件只提取一次
+    names = {file_path: os.path.basename(file_path) for file_path in image_files} if verbose else {}
+    
+    def record(file_path, hashes, error, cached=False):
+        # 更频繁的进度报告
+        if verbose:
+            done = len(all_hashes) + 1
+            log(f"预计算进度: {done}/{total_files} ({done/total_files*100:.1f}%) - 处理: {names[file_path]}")
+        if error is not None:
+            log(f"预计算哈希失败: {file_path}, 错误: {error}")
+        elif cached:
+            if verbose:
+                log(f"  命中缓存，读取了 {len(hashes)} 个哈希组合")
+        else:
+            if verbose:
+                log(f"  完成，生成了 {len(hashes)} 个哈希组合")
+            if file_path in stats:
+                cache.set(file_path, detector.cache_kind, stats[file_path], hashes)
+        all_hashes[file_path] = hashes
+    
+    # 缓存在主进程中读写，只把未命中的文件交给计算
+    pending = []
+    for file_path in image_files:
+        cached = None
+        if cache is not None:
+            try:
+                stats[file_path] = os.stat(file_path)
+                cached = cache.get(file_path, detector.cache_kind, stats[file_path])
+            except OSError:
+                pass
+        if cached is not None:
+            record(file_path, _restore_cached_hashes(cached), None, cached=True)
+        else:
+            pending.append(file_path)
+    
+    max_workers = max_workers or min(os.cpu_count() or 1, max(len(pending), 1))
+    if max_workers > 1 and len(pending) > 1:
+        # 解码、旋转和哈希计算受GIL限制，按文件分给多个进程，日志在主进程中输出
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=PROCESS_CONTEXT) as executor:
+            futures = [executor.submit(_precompute_one, file_path, detector.angles, detector.scales, detector.hash_sizes)
+                       for file_path in pending]
+            for future in as_completed(futures):
+                record(*future.result())
+    else:
+        for file_path in pending:
+            record(*_precompute_one(file_path, detector.angles, detector.scales, detector.hash_sizes))
+    
+    if cache is not None:
+        cache.commit()
+    
+    # 每个文件的哈希只打包一次，比较时直接使用
+    packed_hashes = {file_path: _pack_multi_scale_hashes(hashes) for file_path, hashes in all_hashes.items()}
+    
+    # 只有至少一个哈希组合对可能得到两票的文件对才需要完整比较
+    neighbors = _candidate_neighbors([all_hashes.get(file_path, []) for file_path in image_files],
+                                     (dhash_threshold, phash_threshold, ahash_threshold))
+    total_comparisons = sum(1 for i, candidates in enumerate(neighbors) for j in candidates if j > i)
+    log(f"预计算完成，索引筛选后需要比较 {total_comparisons} 个候选文件对，开始比较...")
     
     comparison_count = 0
     for i, file1 in enumerate(image_files):
@@ -740,32 +1218,36 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
             continue
         
         # 报告当前处理的主文件
-        elapsed = time.time() - start_time
-        log(f"处理主文件 {i+1}/{total_files} ({(i+1)/total_files*100:.1f}%): {os.path.basename(file1)} - 已用时 {elapsed:.1f}秒")
+        if verbose:
+            elapsed = time.time() - start_time
+            log(f"处理主文件 {i+1}/{total_files} ({(i+1)/total_files*100:.1f}%): {names[file1]} - 已用时 {elapsed:.1f}秒")
         
         similar_files = []
         detection_info = []
         
-        for j, file2 in enumerate(image_files[i+1:], i+1):
+        candidates = sorted(j for j in neighbors[i] if j > i)
+        for j in candidates:
+            file2 = image_files[j]
             if file2 in processed:
                 continue
             
             comparison_count += 1
             
             # 更频繁的比较进度报告 - 每5次比较或重要比较时报告
-            if comparison_count % 5 == 0 or j == len(image_files) - 1:
+            if verbose and (comparison_count % 5 == 0 or j == candidates[-1]):
                 progress = comparison_count / total_comparisons * 100
                 elapsed = time.time() - start_time
                 estimated_total = elapsed / (comparison_count / total_comparisons) if comparison_count > 0 else 0
                 remaining = estimated_total - elapsed
-                log(f"  比较进度: {comparison_count}/{total_comparisons} ({progress:.1f}%) - 当前对比: {os.path.basename(file1)} vs {os.path.basename(file2)} - 预计剩余 {remaining:.0f}秒")
+                log(f"  比较进度: {comparison_count}/{total_comparisons} ({progress:.1f}%) - 当前对比: {names[file1]} vs {names[file2]} - 预计剩余 {remaining:.0f}秒")
             
             try:
                 # 使用预计算的哈希值进行快速比较
                 result = detector._fast_compare_with_precomputed_hashes(
                     all_hashes.get(file1, []), all_hashes.get(file2, []),
                     file1, file2, dhash_threshold, phash_threshold, 
-                    ahash_threshold, feature_weight
+                    ahash_threshold, feature_weight,
+                    packed_hashes.get(file1), packed_hashes.get(file2)
                 )
                 
                 if result and result['is_similar'] and result['confidence'] >= confidence_threshold:
@@ -777,6 +1259,9 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
                         'best_match': result['best_match']
                     })
                     
+                    if not verbose:
+                        continue
+                    
                     # 详细的相似图片发现日志
                     rotation_info = ""
                     if result['best_match'] and 'rotation_angle' in result['best_match']:
@@ -790,7 +1275,7 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
                         if abs(scale_factor - 1.0) > 0.1:
                             scale_info = f" (缩放比例: {scale_factor:.2f})"
                     
-                    log(f"  ✓ 找到相似图片: {os.path.basename(file1)} <-> {os.path.basename(file2)}")
+                    log(f"  ✓ 找到相似图片: {names[file1]} <-> {names[file2]}")
                     log(f"    检测类型: {result['detection_type']}, 置信度: {result['confidence']:.3f}{rotation_info}{scale_info}")
             
             except Exception as e:
@@ -815,18 +1300,19 @@ def batch_compare_with_enhanced_similarity(image_files: List[str],
             similar_groups.append(similar_group)
             
             # 详细的相似组发现日志
-            log(f"\n🎯 发现相似组 #{len(similar_groups)}: {len(all_files)} 个文件")
-            log(f"  主文件: {os.path.basename(file1)}")
-            for info in detection_info:
-                log(f"  相似文件: {os.path.basename(info['file'])} (置信度: {info['confidence']:.3f}, 类型: {info['detection_type']})")
-            log(f"  平均置信度: {similar_group['avg_confidence']:.3f}")
-            log(f"  检测原因: {reason}\n")
+            if verbose:
+                log(f"\n🎯 发现相似组 #{len(similar_groups)}: {len(all_files)} 个文件")
+                log(f"  主文件: {names[file1]}")
+                for info in detection_info:
+                    log(f"  相似文件: {names[info['file']]} (置信度: {info['confidence']:.3f}, 类型: {info['detection_type']})")
+                log(f"  平均置信度: {similar_group['avg_confidence']:.3f}")
+                log(f"  检测原因: {reason}\n")
             
             # 标记为已处理
             for file_path in all_files:
                 processed.add(file_path)
-        else:
-            log(f"  未找到与 {os.path.basename(file1)} 相似的图片")
+        elif verbose:
+            log(f"  未找到与 {names[file1]} 相似的图片")
     
     elapsed = time.time() - start_time
     log(f"增强相似度检测完成！总用时 {elapsed:.1f}秒，找到 {len(similar_groups)} 个相似组")
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+GPU批量感知哈希模块
+
+图片在CPU上解码和缩放，缩放后的像素按批堆叠后在GPU上完成pHash的DCT、
+中值比较以及dHash/aHash的比较，结果与hash_utils中的CPU实现一致
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .hash_utils import PHASH_RESAMPLE, SMALL_HASH_RESAMPLE, _bits_to_hex, _open_gray, _phash_basis
+
+# 可选依赖：PyTorch（CUDA），导入较慢，只在需要时导入
+torch = None
+
+
+def _import_torch():
+    """
+    按需导入PyTorch
+
+    Returns:
+        torch模块，未安装时返回None
+    """
+    global torch
+    if torch is None:
+        try:
+            import torch as _torch
+        except ImportError:
+            return None
+        torch = _torch
+    return torch
+
+
+def is_cuda_available() -> bool:
+    """
+    检查是否可以使用CUDA GPU计算哈希
+
+    Returns:
+        安装了PyTorch且有可用的CUDA设备时返回True
+    """
+    return _import_torch() is not None and torch.cuda.is_available()
+
+
+def _resize_for_hashes(image_path: str, hash_size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    解码图片并缩放为三种哈希所需的灰度像素
+
+    Args:
+        image_path: 图片文件路径
+        hash_size: 哈希大小
+
+    Returns:
+        (dHash像素, pHash像素, aHash像素)，均为uint8数组
+    """
+    gray = _open_gray(image_path)
+
+    return (
+        np.asarray(gray.resize((hash_size + 1, hash_size), SMALL_HASH_RESAMPLE)),
+        np.asarray(gray.resize((hash_size * 4, hash_size * 4), PHASH_RESAMPLE)),
+        np.asarray(gray.resize((hash_size, hash_size), SMALL_HASH_RESAMPLE))
+    )
+
+
+def _dct_matrix(hash_size: int, device) -> 'torch.Tensor':
+    """
+    生成与_phash_from_gray相同的余弦基矩阵
+
+    Args:
+        hash_size: 哈希大小
+        device: torch设备
+
+    Returns:
+        形状为(hash_size, hash_size * 4)的float64矩阵
+    """
+    return torch.tensor(_phash_basis(hash_size)).to(device)
+
+
+def _hash_batch(dhash_pixels: np.ndarray, phash_pixels: np.ndarray, ahash_pixels: np.ndarray,
+                hash_size: int, device) -> List[Dict[str, str]]:
+    """
+    在GPU上计算一批图片的三种感知哈希
+
+    Args:
+        dhash_pixels: 形状为(B, hash_size, hash_size + 1)的像素
+        phash_pixels: 形状为(B, hash_size * 4, hash_size * 4)的像素
+        ahash_pixels: 形状为(B, hash_size, hash_size)的像素
+        hash_size: 哈希大小
+        device: torch设备
+
+    Returns:
+        每张图片包含'dhash'、'phash'、'ahash'的字典列表
+    """
+    d = torch.from_numpy(dhash_pixels).to(device)
+    dhash_bits = (d[:, :, 1:] > d[:, :, :-1]).reshape(len(d), -1)
+
+    # dct[i, j] = sum(p[y, x] * C[i, x] * C[j, y])，即 C @ p.T @ C.T
+    basis = _dct_matrix(hash_size, device)
+    p = torch.from_numpy(phash_pixels).to(device, dtype=torch.float64)
+    dct = (basis @ p.transpose(1, 2) @ basis.T).reshape(len(p), -1)[:, 1:]
+    phash_bits = dct > dct.median(dim=1, keepdim=True).values
+
+    a = torch.from_numpy(ahash_pixels).to(device, dtype=torch.float64).reshape(len(ahash_pixels), -1)
+    ahash_bits = a > a.mean(dim=1, keepdim=True)
+    pure = a.std(dim=1, unbiased=False) < 3.0
+
+    # 只拷贝一次回主机
+    dhash_bits, phash_bits, ahash_bits, pure = (t.cpu().numpy() for t in (dhash_bits, phash_bits, ahash_bits, pure))
+
+    return [{
+        'dhash': _bits_to_hex(dhash_bits[b]),
+        'phash': _bits_to_hex(phash_bits[b]),
+        'ahash': "pure_color_image" if pure[b] else _bits_to_hex(ahash_bits[b])
+    } for b in range(len(dhash_bits))]
+
+
+def calculate_all_hashes_batch(image_paths: List[str], hash_size: int = 8, batch_size: int = 1024,
+                               max_workers: Optional[int] = None,
+                               device: str = 'cuda') -> List[Tuple[Optional[Dict[str, str]], Optional[Exception]]]:
+    """
+    批量计算图片的dHash、pHash和aHash，解码和缩放使用线程池，哈希计算在GPU上按批进行
+
+    Args:
+        image_paths: 图片文件路径列表
+        hash_size: 哈希大小，默认为8
+        batch_size: 每批送入GPU的图片数，默认为1024
+        max_workers: 解码线程数，默认由ThreadPoolExecutor决定
+        device: torch设备，默认为'cuda'
+
+    Returns:
+        与image_paths一一对应的(哈希字典, 异常)列表，处理失败时哈希字典为None
+    """
+    if _import_torch() is None:
+        raise ImportError("GPU批量哈希需要安装PyTorch: pip install torch")
+
+    def load(image_path):
+        try:
+            return _resize_for_hashes(image_path, hash_size), None
+        except Exception as e:
+            return None, ValueError(f"无法计算感知哈希: {image_path}, 错误: {str(e)}")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(image_paths), batch_size):
+            loaded = list(executor.map(load, image_paths[start:start + batch_size]))
+            ok = [pixels for pixels, error in loaded if error is None]
+
+            hashes = iter(_hash_batch(
+                np.stack([pixels[0] for pixels in ok]),
+                np.stack([pixels[1] for pixels in ok]),
+                np.stack([pixels[2] for pixels in ok]),
+                hash_size, device
+            ) if ok else [])
+
+            for pixels, error in loaded:
+                results.append((None, error) if error is not None else (next(hashes), None))
+
+    return results
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+汉明距离批量计算模块
+
+将感知哈希打包为uint64数组，使用NumPy向量化的异或+位计数批量计算汉明距离
+"""
+
+import multiprocessing
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# 纯色图片等无效哈希与任意哈希之间的距离（64位哈希的最大距离）
+INVALID_DISTANCE = 64
+
+# SWAR位计数所需的掩码常量
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+# Python 3.10+ 提供C实现的int.bit_count()
+_HAS_BIT_COUNT = hasattr(int, 'bit_count')
+
+# 旋转哈希和增强检测预计算哈希的进程池用spawn启动工作进程：fork会复制主进程中
+# Numba多线程内核（parallel=True，如旋转哈希的距离内核）的线程池状态，可能使子进程卡死或解释器退出时挂起
+PROCESS_CONTEXT = multiprocessing.get_context('spawn')
+
+# 可选依赖：Numba，_popcount_jit供旋转哈希的编译内核使用
+try:
+    import numba
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+
+def popcount64(x: np.ndarray) -> np.ndarray:
+    """
+    计算uint64数组中每个元素的置位数量
+
+    NumPy 2.0及以上使用内置的np.bitwise_count，否则使用SWAR位运算实现
+
+    Args:
+        x: uint64数组
+
+    Returns:
+        与x形状相同的置位数量数组
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x)
+
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return ((x * _H01) >> np.uint64(56)).astype(np.uint8)
+
+
+def popcount_xor(a: int, b: int) -> int:
+    """
+    计算两个整数哈希之间的汉明距离（异或后的置位数量）
+
+    Args:
+        a: 第一个哈希值
+        b: 第二个哈希值
+
+    Returns:
+        汉明距离
+    """
+    if _HAS_BIT_COUNT:
+        return (a ^ b).bit_count()
+    return bin(a ^ b).count('1')
+
+
+def hex_to_uint64(hex_hash: str) -> Tuple[int, bool]:
+    """
+    将十六进制哈希转换为整数
+
+    Args:
+        hex_hash: 十六进制哈希值（最多16个字符）
+
+    Returns:
+        (整数值, 是否有效)，纯色图片标记等无效哈希返回(0, False)
+    """
+    try:
+        return int(hex_hash, 16), True
+    except (TypeError, ValueError):
+        return 0, False
+
+
+def pack_hashes(file_hashes: List[Dict], keys: Tuple[str, ...] = ('dhash', 'phash', 'ahash')) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    将每个文件的十六进制哈希打包为uint64矩阵
+
+    Args:
+        file_hashes: 每个元素包含各哈希字段的字典列表
+        keys: 要打包的哈希字段，决定矩阵的列顺序
+
+    Returns:
+        (哈希矩阵, 有效标记矩阵)，形状均为(N, len(keys))，按列连续存储
+    """
+    n = len(file_hashes)
+    hashes = np.zeros((n, len(keys)), dtype=np.uint64, order='F')
+    valid = np.zeros((n, len(keys)), dtype=bool, order='F')
+
+    for i, item in enumerate(file_hashes):
+        for k, key in enumerate(keys):
+            value, ok = hex_to_uint64(item[key])
+            hashes[i, k] = value
+            valid[i, k] = ok
+
+    return hashes, valid
+
+
+def _window_keys(hashes: np.ndarray, valid: np.ndarray, limits: np.ndarray, min_votes: int, block_elements: int,
+                 column: int, rows: np.ndarray, ends: np.ndarray, start: int, end: int,
+                 seen_masks: Tuple[np.uint64, ...] = ()) -> List[np.ndarray]:
+    """
+    核实排序后每个位置与其窗口内后续文件组成的候选对，返回编码为i * N + j的键
+
+    Args:
+        hashes: 形状为(N, K)的uint64哈希矩阵
+        valid: 形状为(N, K)的有效标记矩阵
+        limits: 长度为K的int64阈值数组
+        min_votes: 至少需要多少种算法判断为相似
+        block_elements: 每批核实的最大候选对数量
+        column: 生成候选所用的哈希列
+        rows: 排序后的文件行号
+        ends: 位置p的候选为排序后(p, ends[p])范围内的文件
+        start: 处理的起始位置
+        end: 处理的结束位置（不包含）
+        seen_masks: 当前列中这些位掩码之一完全相同的文件对已在别处找到，直接跳过
+
+    Returns:
+        键数组列表，可能包含重复的文件对
+    """
+    n = hashes.shape[0]
+    limit = int(limits[column])
+    column_hashes = hashes[rows, column]
+    positions = np.arange(len(rows))
+    widths = np.maximum(ends - positions - 1, 0)
+    offsets = np.concatenate(([0], np.cumsum(widths)))
+    found = []
+
+    while start < end:
+        stop = int(np.searchsorted(offsets, offsets[start] + block_elements, side='right')) - 1
+        stop = min(max(stop, start + 1), end)
+
+        count = int(offsets[stop] - offsets[start])
+        if count:
+            first = np.repeat(positions[start:stop], widths[start:stop])
+            step = np.arange(count) - np.repeat(offsets[start:stop] - offsets[start], widths[start:stop])
+            second = first + 1 + step
+
+            # 先只比较当前列，该列不相似的文件对若满足条件必然会在其他索引列中被找到
+            difference = column_hashes[first] ^ column_hashes[second]
+            same = popcount64(difference) < limit
+            for mask in seen_masks:
+                same &= (difference & mask) != 0
+            a = rows[first[same]]
+            b = rows[second[same]]
+            left = np.minimum(a, b)
+            right = np.maximum(a, b)
+
+            distances = popcount64(hashes[left] ^ hashes[right])
+            distances = np.where(valid[left] & valid[right], distances, INVALID_DISTANCE)
+            keep = (distances < limits).sum(axis=1) >= min_votes
+            found.append(left[keep] * n + right[keep])
+
+        start = stop
+
+    return found
+
+
+def segment_bounds(values: np.ndarray, limit: int) -> List[Tuple[int, int]]:
+    """
+    按鸽巢原理划分哈希的位段
+
+    距离小于limit即最多limit - 1位不同，分成limit段后至少有一段完全相同；
+    阈值超过位数时无法分段，返回一个空段，所有值落入同一个桶
+
+    Args:
+        values: 非空的uint64哈希数组，按其中最大值的位数分段
+        limit: 阈值，距离严格小于阈值视为相似
+
+    Returns:
+        (起始位, 结束位) 列表，低位在前
+    """
+    bits = max(int(values.max()).bit_length(), 1)
+    if limit > bits:
+        return [(0, 0)]
+    edges = [bits * c // limit for c in range(limit + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _multi_index_keys(hashes: np.ndarray, valid: np.ndarray, limits: np.ndarray, min_votes: int,
+                      block_elements: int) -> List[np.ndarray]:
+    """
+    按哈希分段的桶查找相似文件对，返回编码为i * N + j的键
+
+    Args:
+        hashes: 形状为(N, K)的uint64哈希矩阵
+        valid: 形状为(N, K)的有效标记矩阵
+        limits: 长度为K的int64阈值数组
+        min_votes: 至少需要多少种算法判断为相似
+        block_elements: 每批核实的最大候选对数量
+
+    Returns:
+        键数组列表，可能包含重复的文件对
+    """
+    n, k = hashes.shape
+    index_columns = np.argsort(limits, kind='stable')[:k - min_votes + 1]
+    found = []
+
+    for column in index_columns:
+        limit = int(limits[column])
+        rows = np.flatnonzero(valid[:, column])
+        if limit <= 0 or len(rows) < 2:
+            continue
+
+        column_hashes = hashes[rows, column]
+        seen_masks = ()
+        for low, high in segment_bounds(column_hashes, limit):
+            mask = (1 << (high - low)) - 1
+            keys = (column_hashes >> np.uint64(low)) & np.uint64(mask)
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+
+            # 位置p的候选为同一个桶内排在其后的文件；在之前的分段中已同桶的文件对跳过，
+            # 相同的哈希不会在每个分段中重复产生候选
+            ends = np.searchsorted(keys, keys, side='right')
+            found.extend(_window_keys(hashes, valid, limits, min_votes, block_elements,
+                                      column, rows[order], ends, 0, len(rows), seen_masks))
+            seen_masks += (np.uint64(mask << low),)
+
+    return found
+
+
+def _pairs_from_keys(hashes: np.ndarray, valid: np.ndarray, found: List[np.ndarray]) -> List[Tuple[int, int, np.ndarray]]:
+    """
+    将文件对键去重、排序并计算距离
+
+    Args:
+        hashes: 形状为(N, K)的uint64哈希矩阵
+        valid: 形状为(N, K)的有效标记矩阵
+        found: 编码为i * N + j的键数组列表
+
+    Returns:
+        (i, j, distances) 列表，按(i, j)排序
+    """
+    if not found:
+        return []
+
+    # 同一文件对可能在多列中都是候选，去重后按(i, j)排序
+    n = hashes.shape[0]
+    keys = np.unique(np.concatenate(found))
+    left = keys // n
+    right = keys % n
+    distances = popcount64(hashes[left] ^ hashes[right])
+    distances = np.where(valid[left] & valid[right], distances, INVALID_DISTANCE)
+
+    return [(int(i), int(j), d) for i, j, d in zip(left, right, distances)]
+
+
+def find_similar_pairs_multi_index(hashes: np.ndarray, valid: np.ndarray, thresholds, min_votes: int = 2,
+                                   block_elements: int = 1 << 20) -> List[Tuple[int, int, np.ndarray]]:
+    """
+    按鸽巢原理分段分桶查找相似文件对，结果与两两比较全部文件相同
+
+    距离小于阈值T的两个哈希最多有T - 1位不同，把哈希分成T段后至少有一段完全相同。
+    每段按值分桶，只有落在同一个桶中的文件才是候选，相似文件稀疏时候选数量接近线性。
+    满足K种算法中至少min_votes种相似的文件对，必然在阈值最小的(K - min_votes + 1)种算法中
+    至少有一种相似，因此只需在这几列上生成候选（该列本身相似），再计算全部距离核实
+
+    Args:
+        hashes: 形状为(N, K)的uint64哈希矩阵
+        valid: 形状为(N, K)的有效标记矩阵
+        thresholds: 长度为K的阈值序列，距离严格小于阈值视为相似
+        min_votes: 至少需要多少种算法判断为相似
+        block_elements: 每批核实的最大候选对数量，用于限制临时内存
+
+    Returns:
+        (i, j, distances) 列表，其中 i < j，distances为长度K的距离数组
+    """
+    limits = np.asarray(thresholds, dtype=np.int64)
+    return _pairs_from_keys(hashes, valid, _multi_index_keys(hashes, valid, limits, min_votes, block_elements))
+
+
+if HAS_NUMBA:
+    @numba.njit(inline='always')
+    def _popcount_jit(x):
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
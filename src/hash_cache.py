@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+哈希缓存模块
+
+将文件哈希、感知哈希和纯色检测结果持久化到SQLite数据库，
+以(绝对路径, 修改时间, 文件大小)判断缓存是否有效，重复扫描同一目录时跳过图片解码
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Optional
+
+# 哈希缓存数据库文件名（位于结果输出目录中）
+HASH_CACHE_FILENAME = "hash_cache.db"
+
+
+class HashCache:
+    """
+    基于SQLite的哈希结果缓存，可在多个线程中同时使用
+    """
+
+    def __init__(self, db_path: str):
+        """
+        初始化哈希缓存
+
+        Args:
+            db_path: 缓存数据库文件路径
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        with self._lock:
+            self._connection()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        返回数据库连接，关闭后再次使用时重新打开（调用方需持有锁）
+
+        Returns:
+            SQLite数据库连接
+        """
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hash_cache ("
+                "path TEXT NOT NULL, "
+                "kind TEXT NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "value TEXT NOT NULL, "
+                "PRIMARY KEY (path, kind))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, file_path: str, kind: str, stat: os.stat_result) -> Optional[Any]:
+        """
+        读取缓存结果
+
+        Args:
+            file_path: 文件路径
+            kind: 结果类型（如'perceptual:8'），同一文件的不同结果分开存储
+            stat: 文件当前的os.stat结果，修改时间或大小不一致时视为未命中
+
+        Returns:
+            缓存的结果，未命中时返回None
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT mtime_ns, size, value FROM hash_cache WHERE path = ? AND kind = ?",
+                (os.path.abspath(file_path), kind)
+            ).fetchone()
+
+        if row is None or row[0] != stat.st_mtime_ns or row[1] != stat.st_size:
+            return None
+        return json.loads(row[2])
+
+    def set(self, file_path: str, kind: str, stat: os.stat_result, value: Any):
+        """
+        写入缓存结果
+
+        Args:
+            file_path: 文件路径
+            kind: 结果类型
+            stat: 计算结果时文件的os.stat结果
+            value: 可JSON序列化的结果
+        """
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO hash_cache (path, kind, mtime_ns, size, value) VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(file_path), kind, stat.st_mtime_ns, stat.st_size, json.dumps(value))
+            )
+
+    def prune(self, directory: Optional[str] = None) -> int:
+        """
+        清理已删除或已修改文件的缓存记录
+
+        Args:
+            directory: 只检查该目录下的记录，默认为None（检查全部记录）；
+                缓存可能包含其他目录的大量记录，扫描单个目录后不必逐一stat
+
+        Returns:
+            删除的记录数
+        """
+        stale = []
+        with self._lock:
+            if directory is None:
+                rows = self._connection().execute("SELECT path, kind, mtime_ns, size FROM hash_cache").fetchall()
+            else:
+                prefix = os.path.join(os.path.abspath(directory), '')
+                rows = self._connection().execute(
+                    "SELECT path, kind, mtime_ns, size FROM hash_cache WHERE substr(path, 1, ?) = ?",
+                    (len(prefix), prefix)
+                ).fetchall()
+
+        for path, kind, mtime_ns, size in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stale.append((path, kind))
+                continue
+            if stat.st_mtime_ns != mtime_ns or stat.st_size != size:
+                stale.append((path, kind))
+
+        if stale:
+            with self._lock:
+                conn = self._connection()
+                conn.executemany("DELETE FROM hash_cache WHERE path = ? AND kind = ?", stale)
+                conn.commit()
+
+        return len(stale)
+
+    def commit(self):
+        """
+        将缓存写入磁盘
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+
+    def close(self):
+        """
+        提交并关闭缓存数据库，之后再次使用时重新打开
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+哈希内核模块
+
+将已缩放的uint8灰度像素直接计算为整数哈希，以及计算灰度熵。
+安装了Numba时使用编译的本地代码（导入时预编译并缓存到磁盘），否则使用等价的NumPy实现
+"""
+
+import numpy as np
+
+from .hamming import HAS_NUMBA
+
+if HAS_NUMBA:
+    import numba
+
+# 内核支持的最大哈希位数
+MAX_KERNEL_BITS = 64
+
+
+def _pack_bits_u64(bits: np.ndarray) -> int:
+    """
+    将不超过64位的布尔数组按大端位序打包为整数，第一位为最高位
+
+    Args:
+        bits: 布尔数组
+
+    Returns:
+        整数哈希值
+    """
+    bits = bits.ravel()
+    padded = np.zeros(MAX_KERNEL_BITS, dtype=bool)
+    padded[MAX_KERNEL_BITS - len(bits):] = bits
+    return int(np.packbits(padded).view('>u8')[0])
+
+
+def _dhash_u64_numpy(pixels: np.ndarray) -> int:
+    """dhash_u64的NumPy实现"""
+    return _pack_bits_u64(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _ahash_u64_numpy(pixels: np.ndarray) -> int:
+    """ahash_u64的NumPy实现"""
+    return _pack_bits_u64(pixels > np.mean(pixels))
+
+
+def _entropy_u8_numpy(pixels: np.ndarray) -> float:
+    """entropy_u8的NumPy实现，uint8直接计数，无需np.histogram的分箱边界计算"""
+    hist = np.bincount(pixels.ravel(), minlength=256)
+    hist = hist / hist.sum()
+    hist = hist[hist > 0]
+    return float(-np.sum(hist * np.log2(hist)))
+
+
+if HAS_NUMBA:
+    @numba.njit(cache=True, boundscheck=False)
+    def _dhash_u64_jit(pixels):
+        value = np.uint64(0)
+        for y in range(pixels.shape[0]):
+            for x in range(pixels.shape[1] - 1):
+                value = (value << np.uint64(1)) | np.uint64(pixels[y, x + 1] > pixels[y, x])
+        return value
+
+    @numba.njit(cache=True, boundscheck=False)
+    def _ahash_u64_jit(pixels):
+        total = 0
+        for y in range(pixels.shape[0]):
+            for x in range(pixels.shape[1]):
+                total += pixels[y, x]
+        avg = total / pixels.size
+
+        value = np.uint64(0)
+        for y in range(pixels.shape[0]):
+            for x in range(pixels.shape[1]):
+                value = (value << np.uint64(1)) | np.uint64(pixels[y, x] > avg)
+        return value
+
+    @numba.njit(cache=True, fastmath=True, boundscheck=False)
+    def _entropy_u8_jit(pixels):
+        hist = np.zeros(256, dtype=np.int64)
+        for y in range(pixels.shape[0]):
+            for x in range(pixels.shape[1]):
+                hist[pixels[y, x]] += 1
+
+        entropy = 0.0
+        for count in hist:
+            if count > 0:
+                p = count / pixels.size
+                entropy -= p * np.log2(p)
+        return entropy
+
+    # 导入时预编译（有磁盘缓存时直接加载），避免批量处理中第一张图片承担编译开销
+    _warmup = np.zeros((8, 9), dtype=np.uint8)
+    _dhash_u64_jit(_warmup)
+    _ahash_u64_jit(_warmup[:, :8].copy())
+    _entropy_u8_jit(_warmup)
+    del _warmup
+
+
+def dhash_u64(pixels: np.ndarray) -> int:
+    """
+    由已缩放为(hash_size, hash_size + 1)的灰度像素计算dHash整数值
+
+    Args:
+        pixels: C连续的uint8二维数组，哈希位数不超过64
+
+    Returns:
+        整数哈希值，第一位为最高位，与十六进制哈希int(hex, 16)相同
+    """
+    if HAS_NUMBA:
+        return int(_dhash_u64_jit(pixels))
+    return _dhash_u64_numpy(pixels)
+
+
+def ahash_u64(pixels: np.ndarray) -> int:
+    """
+    由已缩放为(hash_size, hash_size)的灰度像素计算aHash整数值
+
+    Args:
+        pixels: C连续的uint8二维数组，哈希位数不超过64
+
+    Returns:
+        整数哈希值，第一位为最高位，与十六进制哈希int(hex, 16)相同
+    """
+    if HAS_NUMBA:
+        return int(_ahash_u64_jit(pixels))
+    return _ahash_u64_numpy(pixels)
+
+
+def entropy_u8(pixels: np.ndarray) -> float:
+    """
+    计算uint8灰度像素的香农熵
+
+    Args:
+        pixels: C连续的uint8二维数组
+
+    Returns:
+        熵值（比特），范围为0到8
+    """
+    if HAS_NUMBA:
+        return float(_entropy_u8_jit(pixels))
+    return _entropy_u8_numpy(pixels)
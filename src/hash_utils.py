@@ -5,67 +5,340 @@
 提供文件哈希和感知哈希算法实现，用于图片查重
 """
 
+import functools
 import hashlib
+import mmap
 import os
-import random
-from typing import Tuple, Dict, List, Optional
+from typing import Dict, Optional, Union
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageStat
 
+from .hamming import popcount_xor
+from .image_io import ImageDecoder, get_decoder
 
-def calculate_file_hash(file_path: str) -> str:
+# 可选依赖：xxHash，非加密哈希，速度远高于MD5/SHA
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+# dHash和aHash缩放到9×8、8×8这样的极小尺寸时使用盒式平均，得到的哈希与LANCZOS相当而缩放快数倍；
+# pHash的DCT系数对滤波器更敏感，仍使用LANCZOS
+SMALL_HASH_RESAMPLE = Image.BOX
+PHASH_RESAMPLE = Image.LANCZOS
+
+# 感知哈希只需要hash_size * 4见方以内的像素块，大JPEG解码时直接缩小到短边不小于此值的灰度图
+HASH_DECODE_MIN_SIDE = 256
+
+# 灰度图的标准差最多比各颜色通道标准差的最大值高出取整误差，
+# 超过纯色阈值加上此余量时不可能是纯色图片，不必再按颜色通道检查
+PURE_COLOR_GRAY_MARGIN = 1.0
+
+# 未指定算法时文件哈希使用的默认算法
+DEFAULT_FILE_HASH_ALGORITHM = 'xxh128' if HAS_XXHASH else 'md5'
+
+
+def _new_file_hasher(algorithm: str):
+    """
+    创建文件哈希计算对象
+    
+    Args:
+        algorithm: 哈希算法，'xxh128'为xxHash的XXH3-128，其余为hashlib支持的算法名（如'md5'、'sha256'）
+        
+    Returns:
+        支持update()和hexdigest()的哈希对象
+    """
+    if algorithm == 'xxh128':
+        if not HAS_XXHASH:
+            raise ValueError("xxh128算法需要安装xxhash: pip install xxhash")
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
+
+
+def _open_existing(file_path: str, **kwargs):
+    """
+    以二进制模式打开文件，不预先检查文件是否存在（省去一次stat，也避免检查与打开之间文件被删除）
+    
+    Args:
+        file_path: 文件路径
+        **kwargs: 传给open的其他参数
+        
+    Returns:
+        已打开的文件对象
+    """
+    try:
+        return open(file_path, 'rb', **kwargs)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"文件不存在: {file_path}") from None
+
+
+def calculate_file_hash(file_path: str, bufsize: int = 1 << 20, algorithm: str = 'md5') -> str:
+    """
+    计算文件的哈希值
+    
+    Args:
+        file_path: 图片文件路径
+        bufsize: 分块读取的缓冲区大小（字节），默认为1MB
+        algorithm: 哈希算法，默认为'md5'，可选'xxh128'（需要xxhash）或hashlib支持的算法
+        
+    Returns:
+        文件的哈希值
+    """
+    hasher = _new_file_hasher(algorithm)
+    buffer = bytearray(bufsize)
+    view = memoryview(buffer)
+    
+    # 复用同一个缓冲区分块读取，避免一次性读入整个文件
+    with _open_existing(file_path, buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            hasher.update(view[:size])
+    
+    return hasher.hexdigest()
+
+
+def calculate_partial_hash(file_path: str, chunk_size: int = 64 * 1024, algorithm: str = 'md5') -> str:
     """
-    计算文件的MD5哈希值
+    计算文件头部和尾部各chunk_size字节的哈希值，用于快速排除不同的文件
+    
+    文件不超过2*chunk_size时读取整个文件，结果与相同算法的calculate_file_hash相同
     
     Args:
         file_path: 图片文件路径
+        chunk_size: 头部和尾部各读取的字节数，默认为64KB
+        algorithm: 哈希算法，与calculate_file_hash相同
         
     Returns:
-        文件的MD5哈希值
+        头部+尾部数据的哈希值
     """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"文件不存在: {file_path}")
+    hasher = _new_file_hasher(algorithm)
+    with _open_existing(file_path) as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if file_size <= 2 * chunk_size:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(chunk_size))
+            f.seek(-chunk_size, os.SEEK_END)
+            hasher.update(f.read(chunk_size))
+    
+    return hasher.hexdigest()
+
+
+def _open_gray(image_path: str) -> Image.Image:
+    """
+    解码图片为计算感知哈希用的灰度图，大JPEG按HASH_DECODE_MIN_SIDE缩小解码
+    
+    Args:
+        image_path: 图片文件路径
         
-    with open(file_path, 'rb') as f:
-        return hashlib.md5(f.read()).hexdigest()
+    Returns:
+        灰度PIL图像
+    """
+    with _open_existing(image_path) as f:
+        return get_decoder().decode(f, image_path, gray_min_side=HASH_DECODE_MIN_SIDE).convert('L')
 
 
-def calculate_dhash(image_path: str, hash_size: int = 8) -> str:
+def _open_color(image_path: str) -> Image.Image:
     """
-    计算图片的差值哈希(dHash)
+    解码图片为检测纯色用的彩色图，大JPEG按HASH_DECODE_MIN_SIDE缩小解码
     
     Args:
         image_path: 图片文件路径
-        hash_size: 哈希大小，默认为8
         
     Returns:
-        图片的dHash值（十六进制字符串）
+        PIL图像
+    """
+    with _open_existing(image_path) as f:
+        return get_decoder().decode(f, image_path, gray_min_side=HASH_DECODE_MIN_SIDE, gray=False)
+
+
+def _bits_to_hex(bits: np.ndarray) -> str:
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"文件不存在: {image_path}")
+    将布尔数组按每4位一组转换为十六进制字符串（不足4位的尾部被丢弃）
     
-    # 打开图片并转换为灰度图
-    try:
-        image = Image.open(image_path).convert('L')
-    except Exception as e:
-        raise ValueError(f"无法打开或处理图片: {image_path}, 错误: {str(e)}")
+    Args:
+        bits: 布尔数组
+        
+    Returns:
+        十六进制字符串
+    """
+    bits = np.asarray(bits, dtype=bool).ravel()
+    nibbles = len(bits) // 4
     
+    # 按大端位序打包为字节后转十六进制，每4位对应一个字符；奇数个半字节时去掉补零产生的末尾字符
+    return np.packbits(bits[:nibbles * 4]).tobytes().hex()[:nibbles]
+
+
+def _median(values: np.ndarray) -> float:
+    """
+    计算一维数组的中值，长度为奇数时（如8×8 pHash去掉直流分量后的63个系数）直接用一次快速选择
+    
+    Args:
+        values: 一维数组
+        
+    Returns:
+        中值
+    """
+    if len(values) % 2:
+        middle = len(values) // 2
+        return np.partition(values, middle)[middle]
+    return np.median(values)
+
+
+@functools.lru_cache(maxsize=None)
+def _phash_basis(hash_size: int) -> np.ndarray:
+    """
+    生成pHash使用的余弦基矩阵，按哈希大小缓存，只计算一次
+    
+    Args:
+        hash_size: 哈希大小
+        
+    Returns:
+        形状为(hash_size, hash_size * 4)的只读float64矩阵，C[i, x] = cos(pi * i * x / (hash_size * 4))
+    """
+    size = hash_size * 4
+    basis = np.cos(np.pi * np.arange(hash_size).reshape(-1, 1) * np.arange(size) / size)
+    basis.setflags(write=False)
+    return basis
+
+
+def _dhash_from_gray(gray: Image.Image, hash_size: int = 8) -> str:
+    """
+    从已解码的灰度图计算dHash
+    
+    Args:
+        gray: 灰度PIL图像
+        hash_size: 哈希大小
+        
+    Returns:
+        dHash值（十六进制字符串）
+    """
     # 调整图片大小为hash_size+1 x hash_size
-    image = image.resize((hash_size + 1, hash_size), Image.LANCZOS)
+    image = gray.resize((hash_size + 1, hash_size), SMALL_HASH_RESAMPLE)
+    return _dhash_from_pixels(np.array(image))
+
+
+def _dhash_from_pixels(pixels: np.ndarray) -> str:
+    """
+    从已缩放为(hash_size, hash_size + 1)的灰度像素计算dHash
     
+    Args:
+        pixels: uint8二维数组
+        
+    Returns:
+        dHash值（十六进制字符串）
+    """
     # 计算差值
-    pixels = np.array(image)
     diff = pixels[:, 1:] > pixels[:, :-1]
     
-    # 将布尔值转换为二进制字符串
-    binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
+    return _bits_to_hex(diff)
+
+
+def _phash_from_gray(gray: Image.Image, hash_size: int = 8) -> str:
+    """
+    从已解码的灰度图计算pHash
+    
+    Args:
+        gray: 灰度PIL图像
+        hash_size: 哈希大小
+        
+    Returns:
+        pHash值（十六进制字符串）
+    """
+    # 调整图片大小
+    image = gray.resize((hash_size * 4, hash_size * 4), PHASH_RESAMPLE)
+    
+    # 转换为numpy数组
+    return _phash_from_pixels(np.array(image), hash_size)
+
+
+def _phash_from_pixels(pixels: np.ndarray, hash_size: int = 8) -> str:
+    """
+    从已缩放为(hash_size * 4, hash_size * 4)的灰度像素计算pHash
+    
+    Args:
+        pixels: uint8二维数组
+        hash_size: 哈希大小
+        
+    Returns:
+        pHash值（十六进制字符串）
+    """
+    # 计算DCT（离散余弦变换的简化版本）：dct[i, j] = sum(p[y, x] * C[i, x] * C[j, y])，
+    # 即 C @ p.T @ C.T，两次矩阵乘法代替逐系数的整幅乘加
+    basis = _phash_basis(hash_size)
+    dct = basis @ pixels.T @ basis.T
+    
+    # 计算DCT的中值（不包括第一个直流分量）
+    dct_flat = dct.flatten()[1:]
+    median = _median(dct_flat)
+    
+    # 生成哈希值
+    return _bits_to_hex(dct_flat > median)
+
+
+def _ahash_from_gray(gray: Image.Image, hash_size: int = 8, pure_color_threshold: float = 3.0) -> str:
+    """
+    从已解码的灰度图计算aHash
+    
+    Args:
+        gray: 灰度PIL图像
+        hash_size: 哈希大小
+        pure_color_threshold: 缩放后像素的标准差低于此值时视为纯色图片，默认为3.0
+        
+    Returns:
+        aHash值（十六进制字符串），纯色图片返回"pure_color_image"
+    """
+    # 调整图片大小
+    image = gray.resize((hash_size, hash_size), SMALL_HASH_RESAMPLE)
+    return _ahash_from_pixels(np.array(image), pure_color_threshold)
+
+
+def _ahash_from_pixels(pixels: np.ndarray, pure_color_threshold: float = 3.0) -> str:
+    """
+    从已缩放为(hash_size, hash_size)的灰度像素计算aHash
+    
+    Args:
+        pixels: uint8二维数组
+        pure_color_threshold: 像素的标准差低于此值时视为纯色图片，默认为3.0
+        
+    Returns:
+        aHash值（十六进制字符串），纯色图片返回"pure_color_image"
+    """
+    # 计算像素均值
+    avg = np.mean(pixels)
+    
+    # 检测是否为纯色图片
+    std_dev = np.std(pixels)
+    if std_dev < pure_color_threshold:  # 阈值可调整，越小越严格
+        return "pure_color_image"
     
-    # 将二进制字符串转换为十六进制
-    hex_hash = ''
-    for i in range(0, len(binary_hash), 4):
-        hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
+    # 生成哈希值
+    return _bits_to_hex(pixels > avg)
+
+
+def calculate_dhash(image_path: str, hash_size: int = 8) -> str:
+    """
+    计算图片的差值哈希(dHash)
+    
+    Args:
+        image_path: 图片文件路径
+        hash_size: 哈希大小，默认为8
+        
+    Returns:
+        图片的dHash值（十六进制字符串）
+    """
+    # 打开图片并转换为灰度图
+    try:
+        image = _open_gray(image_path)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise ValueError(f"无法打开或处理图片: {image_path}, 错误: {str(e)}")
     
-    return hex_hash
+    return _dhash_from_gray(image, hash_size)
 
 
 def calculate_phash(image_path: str, hash_size: int = 8) -> str:
@@ -79,43 +352,12 @@ def calculate_phash(image_path: str, hash_size: int = 8) -> str:
     Returns:
         图片的pHash值（十六进制字符串）
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"文件不存在: {image_path}")
-    
     try:
         # 打开图片并转换为灰度图
-        image = Image.open(image_path).convert('L')
-        
-        # 调整图片大小
-        image = image.resize((hash_size * 4, hash_size * 4), Image.LANCZOS)
-        
-        # 转换为numpy数组
-        pixels = np.array(image)
-        
-        # 计算DCT（离散余弦变换的简化版本）
-        dct = np.zeros((hash_size, hash_size))
-        for i in range(hash_size):
-            for j in range(hash_size):
-                dct[i, j] = np.sum(pixels * np.cos(np.pi * i * np.arange(hash_size * 4) / (hash_size * 4)) 
-                                   * np.cos(np.pi * j * np.arange(hash_size * 4).reshape(-1, 1) / (hash_size * 4)))
-        
-        # 计算DCT的均值（不包括第一个直流分量）
-        dct_flat = dct.flatten()[1:]
-        median = np.median(dct_flat)
-        
-        # 生成哈希值
-        diff = dct_flat > median
-        
-        # 将布尔值转换为二进制字符串
-        binary_hash = ''.join('1' if d else '0' for d in diff)
-        
-        # 将二进制字符串转换为十六进制
-        hex_hash = ''
-        for i in range(0, len(binary_hash), 4):
-            if i + 4 <= len(binary_hash):
-                hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
-        
-        return hex_hash
+        image = _open_gray(image_path)
+        return _phash_from_gray(image, hash_size)
+    except FileNotFoundError:
+        raise
     except Exception as e:
         raise ValueError(f"无法计算pHash: {image_path}, 错误: {str(e)}")
 
@@ -131,40 +373,122 @@ def calculate_ahash(image_path: str, hash_size: int = 8) -> str:
     Returns:
         图片的aHash值（十六进制字符串）
     """
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(f"文件不存在: {image_path}")
-    
     try:
         # 打开图片并转换为灰度图
-        image = Image.open(image_path).convert('L')
-        
-        # 调整图片大小
-        image = image.resize((hash_size, hash_size), Image.LANCZOS)
-        
-        # 计算像素均值
-        pixels = np.array(image)
-        avg = np.mean(pixels)
+        image = _open_gray(image_path)
+        return _ahash_from_gray(image, hash_size)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise ValueError(f"无法计算aHash: {image_path}, 错误: {str(e)}")
+
+
+def calculate_all_hashes(image_path: str, hash_size: int = 8) -> Dict[str, str]:
+    """
+    一次解码图片，同时计算dHash、pHash和aHash
+    
+    与分别调用calculate_dhash/calculate_phash/calculate_ahash结果相同，
+    但图片只打开、解码和灰度转换一次。
+    
+    Args:
+        image_path: 图片文件路径
+        hash_size: 哈希大小，默认为8
         
-        # 检测是否为纯色图片
-        std_dev = np.std(pixels)
-        if std_dev < 3.0:  # 阈值可调整，越小越严格
-            return "pure_color_image"
+    Returns:
+        包含'dhash'、'phash'、'ahash'三个十六进制哈希值的字典
+    """
+    try:
+        # 打开图片并转换为灰度图（只解码一次）
+        gray = _open_gray(image_path)
+        return {
+            'dhash': _dhash_from_gray(gray, hash_size),
+            'phash': _phash_from_gray(gray, hash_size),
+            'ahash': _ahash_from_gray(gray, hash_size)
+        }
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        raise ValueError(f"无法计算感知哈希: {image_path}, 错误: {str(e)}")
+
+
+def _as_gray(image: Image.Image) -> Image.Image:
+    """
+    将PIL图像转换为灰度图，已是灰度图时直接返回
+
+    Args:
+        image: PIL图像
+
+    Returns:
+        'L'模式的PIL图像
+    """
+    return image if image.mode == 'L' else image.convert('L')
+
+
+def calculate_dhash_from_image(image: Image.Image, hash_size: int = 8) -> str:
+    """
+    计算已打开的PIL图像的差值哈希(dHash)，结果与对保存为无损文件后调用calculate_dhash相同
+    
+    Args:
+        image: PIL图像
+        hash_size: 哈希大小，默认为8
         
-        # 生成哈希值
-        diff = pixels > avg
+    Returns:
+        dHash值（十六进制字符串）
+    """
+    return _dhash_from_gray(_as_gray(image), hash_size)
+
+
+def calculate_phash_from_image(image: Image.Image, hash_size: int = 8) -> str:
+    """
+    计算已打开的PIL图像的感知哈希(pHash)，结果与对保存为无损文件后调用calculate_phash相同
+    
+    Args:
+        image: PIL图像
+        hash_size: 哈希大小，默认为8
         
-        # 将布尔值转换为二进制字符串
-        binary_hash = ''.join('1' if d else '0' for d in diff.flatten())
+    Returns:
+        pHash值（十六进制字符串）
+    """
+    return _phash_from_gray(_as_gray(image), hash_size)
+
+
+def calculate_ahash_from_image(image: Image.Image, hash_size: int = 8) -> str:
+    """
+    计算已打开的PIL图像的平均哈希(aHash)，结果与对保存为无损文件后调用calculate_ahash相同
+    
+    Args:
+        image: PIL图像
+        hash_size: 哈希大小，默认为8
         
-        # 将二进制字符串转换为十六进制
-        hex_hash = ''
-        for i in range(0, len(binary_hash), 4):
-            if i + 4 <= len(binary_hash):
-                hex_hash += hex(int(binary_hash[i:i+4], 2))[2:]
+    Returns:
+        aHash值（十六进制字符串），纯色图片返回"pure_color_image"
+    """
+    return _ahash_from_gray(_as_gray(image), hash_size)
+
+
+def _is_pure_color_from_image(image: Image.Image, threshold: float = 3.0) -> bool:
+    """
+    根据已解码图片各颜色通道全部像素的标准差判断是否为纯色图片
+    
+    不使用aHash缩放后的8×8灰度块：盒式平均会抹掉细密的纹理（如棋盘格），
+    灰度化则无法区分亮度相同的不同颜色（如红绿各半的图片）
+    
+    Args:
+        image: PIL图像，灰度图只检查一个通道
+        threshold: 标准差阈值，所有通道均低于此值时被视为纯色图片
         
-        return hex_hash
-    except Exception as e:
-        raise ValueError(f"无法计算aHash: {image_path}, 错误: {str(e)}")
+    Returns:
+        如果是纯色图片返回True，否则返回False
+    """
+    # 如果图片太小，可能不是有效图片
+    if image.width < 10 or image.height < 10:
+        return True
+    
+    if image.mode not in ('L', 'RGB'):
+        image = image.convert('RGB')
+    
+    # ImageStat基于直方图计算，不需要把像素复制为数组
+    return all(std < threshold for std in ImageStat.Stat(image).stddev)
 
 
 def is_pure_color_image(image_path: str, threshold: float = 3.0) -> bool:
@@ -179,51 +503,102 @@ def is_pure_color_image(image_path: str, threshold: float = 3.0) -> bool:
         如果是纯色图片返回True，否则返回False
     """
     try:
-        # 打开图片并转换为RGB模式
-        image = Image.open(image_path).convert('RGB')
+        image = _open_color(image_path)
+        return _is_pure_color_from_image(image, threshold)
+    except Exception as e:
+        print(f"检测纯色图片时出错: {image_path}, 错误: {str(e)}")
+        return False
+
+
+def analyze_image(image_path: str, hash_size: int = 8, file_hash_algorithm: str = 'md5',
+                  pure_color_threshold: float = 3.0, decoder: Optional[ImageDecoder] = None,
+                  perceptual: bool = True) -> Dict:
+    """
+    一次读取并解码图片，同时计算文件哈希、纯色标记和三种感知哈希
+    
+    文件哈希基于解码所用的同一份字节数据；各结果与calculate_file_hash、
+    is_pure_color_image和calculate_all_hashes分别计算的结果相同。
+    
+    Args:
+        image_path: 图片文件路径
+        hash_size: 感知哈希大小，默认为8
+        file_hash_algorithm: 文件哈希算法，与calculate_file_hash相同
+        pure_color_threshold: 纯色检测的标准差阈值，默认为3.0
+        decoder: 图片解码器，默认使用get_decoder()返回的共享解码器
+        perceptual: 是否计算感知哈希，为False时三种感知哈希均为None（由调用方另行批量计算）
         
-        # 获取图片尺寸
-        width, height = image.size
+    Returns:
+        包含'file_hash'、'is_pure_color'、'dhash'、'phash'、'ahash'的字典；
+        图片无法解码时is_pure_color为False，三种感知哈希为None，'error'为错误信息
+    """
+    result = {
+        'file_hash': None,
+        'is_pure_color': False,
+        'dhash': None,
+        'phash': None,
+        'ahash': None,
+        'error': None
+    }
+    hasher = _new_file_hasher(file_hash_algorithm)
+    
+    with _open_existing(image_path) as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # 空文件无法映射，也不可能是有效图片
+            result['file_hash'] = hasher.hexdigest()
+            result['error'] = f"无法计算感知哈希: {image_path}, 错误: 文件为空"
+            return result
         
-        # 如果图片太小，可能不是有效图片
-        if width < 10 or height < 10:
-            return True
+        # 将文件映射到内存后直接计算哈希，不把整个文件复制到Python对象中
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            hasher.update(data)
+            result['file_hash'] = hasher.hexdigest()
             
-        # 采样图片像素（对于大图片，不需要检查所有像素）
-        sample_size = min(100, width * height)
-        pixels = []
-        
-        for _ in range(sample_size):
-            x = random.randint(0, width - 1)
-            y = random.randint(0, height - 1)
-            pixels.append(image.getpixel((x, y)))
-        
-        # 计算RGB通道的标准差
-        r_values = [p[0] for p in pixels]
-        g_values = [p[1] for p in pixels]
-        b_values = [p[2] for p in pixels]
-        
-        r_std = np.std(r_values)
-        g_std = np.std(g_values)
-        b_std = np.std(b_values)
-        
-        # 如果所有通道的标准差都小于阈值，认为是纯色图片
-        return r_std < threshold and g_std < threshold and b_std < threshold
+            # JPEG可直接从映射解码；Pillow从同一个已打开的文件读取，数据仍在页缓存中
+            try:
+                image = (decoder or get_decoder()).decode(f, image_path, data, HASH_DECODE_MIN_SIDE)
+            except Exception as e:
+                result['error'] = f"无法计算感知哈希: {image_path}, 错误: {str(e)}"
+                return result
+    
+    try:
+        gray = image.convert('L')
+        
+        # 先用计算哈希的灰度图排除明显不是纯色的图片，其余再按各颜色通道判断；
+        # 大JPEG缩小解码得到的是灰度图，只有这些接近纯色的图片需要重新按彩色解码
+        if _is_pure_color_from_image(gray, pure_color_threshold + PURE_COLOR_GRAY_MARGIN):
+            color = _open_color(image_path) if image.mode == 'L' else image
+            result['is_pure_color'] = _is_pure_color_from_image(color, pure_color_threshold)
+        
+        if perceptual:
+            result['dhash'] = _dhash_from_gray(gray, hash_size)
+            result['phash'] = _phash_from_gray(gray, hash_size)
+            result['ahash'] = _ahash_from_gray(gray, hash_size, pure_color_threshold)
     except Exception as e:
-        print(f"检测纯色图片时出错: {image_path}, 错误: {str(e)}")
-        return False
+        result['is_pure_color'] = False
+        result['dhash'] = result['phash'] = result['ahash'] = None
+        result['error'] = f"无法计算感知哈希: {image_path}, 错误: {str(e)}"
+    
+    return result
 
-def hamming_distance(hash1: str, hash2: str) -> int:
+def hamming_distance(hash1: Union[str, int, bytes], hash2: Union[str, int, bytes]) -> int:
     """
     计算两个哈希值之间的汉明距离
     
     Args:
-        hash1: 第一个哈希值（十六进制字符串）
-        hash2: 第二个哈希值（十六进制字符串）
+        hash1: 第一个哈希值（十六进制字符串、整数或字节串）
+        hash2: 第二个哈希值，类型与hash1相同
         
     Returns:
         两个哈希值之间的汉明距离
     """
+    if isinstance(hash1, (int, np.integer)) and isinstance(hash2, (int, np.integer)):
+        return popcount_xor(int(hash1), int(hash2))
+    
+    if isinstance(hash1, (bytes, bytearray)) and isinstance(hash2, (bytes, bytearray)):
+        if len(hash1) != len(hash2):
+            raise ValueError(f"哈希值长度不匹配: {len(hash1)} vs {len(hash2)}")
+        return popcount_xor(int.from_bytes(hash1, 'little'), int.from_bytes(hash2, 'little'))
+    
     # 处理纯色图片的特殊标记
     if hash1 == "pure_color_image" or hash2 == "pure_color_image":
         return 64  # 返回最大距离，表示与纯色图片不相似
@@ -232,15 +607,5 @@ def hamming_distance(hash1: str, hash2: str) -> int:
     if len(hash1) != len(hash2):
         raise ValueError(f"哈希值长度不匹配: {len(hash1)} vs {len(hash2)}")
     
-    # 计算汉明距离
-    distance = 0
-    for i in range(len(hash1)):
-        # 将十六进制字符转换为二进制，并计算不同位的数量
-        bin1 = bin(int(hash1[i], 16))[2:].zfill(4)
-        bin2 = bin(int(hash2[i], 16))[2:].zfill(4)
-        
-        for j in range(len(bin1)):
-            if bin1[j] != bin2[j]:
-                distance += 1
-    
-    return distance
\ No newline at end of file
+    # 整体转换为整数后异或，再统计不同位的数量
+    return popcount_xor(int(hash1, 16), int(hash2, 16))
@@ -14,6 +14,7 @@ class I18n:
         self.current_language = default_language
         self.translations = {}
         self.load_translations()
+        self._active = self.translations.get(default_language, {})
     
     def load_translations(self):
         """加载所有语言翻译文件"""
@@ -159,14 +160,14 @@ class I18n:
         """设置当前语言"""
         if language_code in self.translations:
             self.current_language = language_code
+            self._active = self.translations[language_code]
             return True
         return False
     
     def get_text(self, key: str, default: str = None) -> str:
         """获取翻译文本"""
-        if self.current_language in self.translations:
-            return self.translations[self.current_language].get(key, default or key)
-        return default or key
+        # 当前语言的翻译表在切换语言时绑定，每次查找只需一次字典访问
+        return self._active.get(key, default or key)
     
     def get_available_languages(self) -> Dict[str, str]:
         """获取可用语言列表"""
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+图片解码模块
+
+按文件格式选择解码后端：安装了PyTurboJPEG时JPEG使用libjpeg-turbo直接解码，
+其余格式或解码失败时使用Pillow（可安装Pillow-SIMD替换Pillow以加速缩放）
+"""
+
+from typing import Optional
+
+from PIL import Image
+
+# 可选依赖：PyTurboJPEG，需要系统中安装libturbojpeg
+try:
+    from turbojpeg import TurboJPEG, TJPF_GRAY, TJPF_RGB
+    _turbojpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _turbojpeg = None
+
+HAS_TURBOJPEG = _turbojpeg is not None
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# JPEG解码时可用的缩小比例（分母），libjpeg在IDCT阶段直接输出1/2、1/4、1/8大小
+JPEG_SCALE_DENOMINATORS = (8, 4, 2)
+
+
+def jpeg_scale_denominator(width: int, height: int, min_side: int) -> int:
+    """
+    选择JPEG缩小解码的比例，使缩小后的短边仍不小于min_side
+
+    Args:
+        width: 原图宽度
+        height: 原图高度
+        min_side: 缩小后短边的最小值
+
+    Returns:
+        缩小比例的分母，不能缩小时返回1
+    """
+    short_side = min(width, height)
+    for denominator in JPEG_SCALE_DENOMINATORS:
+        if short_side // denominator >= min_side:
+            return denominator
+    return 1
+
+
+class ImageDecoder:
+    """
+    图片解码策略
+    """
+
+    def __init__(self, use_turbojpeg: bool = True):
+        """
+        初始化解码器
+
+        Args:
+            use_turbojpeg: 可用时是否使用libjpeg-turbo解码JPEG，默认为True
+        """
+        self.use_turbojpeg = use_turbojpeg and HAS_TURBOJPEG
+
+    def decode(self, file_obj, image_path: str, buffer=None, gray_min_side: Optional[int] = None,
+               gray: bool = True) -> Image.Image:
+        """
+        解码图片并返回已加载像素的Image对象
+
+        Args:
+            file_obj: 已以二进制模式打开的图片文件
+            image_path: 图片文件路径，用于根据扩展名选择后端
+            buffer: 文件内容的缓冲区（如mmap），提供时JPEG后端直接从中解码
+            gray_min_side: 提供时，JPEG在短边不小于此值的前提下按1/2、1/4或1/8缩小解码，
+                并直接解码为灰度图，跳过大部分IDCT和颜色转换；其他格式不受影响
+            gray: 缩小解码时是否解码为灰度图，默认为True；为False时缩小解码为RGB图
+
+        Returns:
+            解码后的图片，缩小解码且gray为True时为'L'模式
+        """
+        if self.use_turbojpeg and buffer is not None and image_path.lower().endswith(JPEG_EXTENSIONS):
+            try:
+                if gray_min_side:
+                    width, height, _, _ = _turbojpeg.decode_header(buffer)
+                    denominator = jpeg_scale_denominator(width, height, gray_min_side)
+                    if denominator > 1:
+                        if not gray:
+                            return Image.fromarray(_turbojpeg.decode(
+                                buffer, pixel_format=TJPF_RGB, scaling_factor=(1, denominator)), 'RGB')
+                        pixels = _turbojpeg.decode(buffer, pixel_format=TJPF_GRAY, scaling_factor=(1, denominator))
+                        return Image.fromarray(pixels[:, :, 0], 'L')
+                return Image.fromarray(_turbojpeg.decode(buffer, pixel_format=TJPF_RGB), 'RGB')
+            except Exception:
+                # CMYK等libjpeg-turbo无法直接转换的JPEG交给Pillow处理
+                pass
+
+        file_obj.seek(0)
+        image = Image.open(file_obj)
+        if gray_min_side and image.format == 'JPEG':
+            denominator = jpeg_scale_denominator(*image.size, gray_min_side)
+            if denominator > 1:
+                # draft选择不小于请求大小的最大缩小比例，请求恰好为原图的1/denominator
+                image.draft('L' if gray else 'RGB', (image.size[0] // denominator, image.size[1] // denominator))
+        image.load()
+        return image
+
+
+_default_decoder: Optional[ImageDecoder] = None
+
+
+def get_decoder() -> ImageDecoder:
+    """
+    获取默认解码器
+
+    Returns:
+        全局共享的ImageDecoder实例
+    """
+    global _default_decoder
+    if _default_decoder is None:
+        _default_decoder = ImageDecoder()
+    return _default_decoder
@@ -11,6 +11,13 @@ import os
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+# 可选依赖：orjson，C实现的JSON编码，直接输出UTF-8字节
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 
 class ResultLogger:
     """
@@ -57,20 +64,16 @@ class ResultLogger:
         
         with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
             fieldnames = ['group_id', 'duplicate_reason', 'file_path']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.writer(csvfile)
             
-            writer.writeheader()
+            writer.writerow(fieldnames)
             
-            for group_id, group in enumerate(duplicate_groups, 1):
-                reason = group.get('reason', '未知')
-                files = group.get('files', [])
-                
-                for file_path in files:
-                    writer.writerow({
-                        'group_id': group_id,
-                        'duplicate_reason': reason,
-                        'file_path': file_path
-                    })
+            # 按fieldnames的顺序直接生成元组，一次writerows写出，省去逐行构造字典
+            writer.writerows(
+                (group_id, group.get('reason', '未知'), file_path)
+                for group_id, group in enumerate(duplicate_groups, 1)
+                for file_path in group.get('files', [])
+            )
         
         return filepath
     
@@ -91,11 +94,18 @@ class ResultLogger:
         filepath = os.path.join(self.output_dir, filename)
         
         # 为每个组添加组ID
-        result = []
-        for group_id, group in enumerate(duplicate_groups, 1):
-            group_with_id = group.copy()
-            group_with_id['group_id'] = group_id
-            result.append(group_with_id)
+        result = [{**group, 'group_id': group_id} for group_id, group in enumerate(duplicate_groups, 1)]
+        
+        if HAS_ORJSON:
+            try:
+                data = orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+            except TypeError:
+                # 超过64位的整数等orjson不支持的值交给json模块处理
+                data = None
+            if data is not None:
+                with open(filepath, 'wb') as jsonfile:
+                    jsonfile.write(data)
+                return filepath
         
         with open(filepath, 'w', encoding='utf-8') as jsonfile:
             json.dump(result, jsonfile, ensure_ascii=False, indent=2)
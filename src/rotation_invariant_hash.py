@@ -6,10 +6,46 @@
 """
 
 import os
-import tempfile
-from typing import List, Dict, Tuple
-from PIL import Image
-from .hash_utils import calculate_dhash, calculate_phash, calculate_ahash, hamming_distance
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from .disjoint_set import DisjointSet
+from .hamming import HAS_NUMBA, INVALID_DISTANCE, PROCESS_CONTEXT, pack_hashes, popcount64, segment_bounds
+from .hash_utils import (
+    PHASH_RESAMPLE,
+    SMALL_HASH_RESAMPLE,
+    _ahash_from_pixels,
+    _dhash_from_pixels,
+    _open_gray,
+    _phash_from_pixels,
+    calculate_dhash_from_image,
+    calculate_phash_from_image,
+    calculate_ahash_from_image
+)
+from .hash_cache import HashCache
+
+if HAS_NUMBA:
+    import numba
+    from .hamming import _popcount_jit
+
+# 批量比较时打包的哈希字段，决定距离数组最后一维的顺序
+ROTATION_HASH_KEYS = ('dhash', 'phash', 'ahash')
+
+# 相似原因中各哈希的名称，与ROTATION_HASH_KEYS顺序一致
+ROTATION_HASH_NAMES = ('dHash', 'pHash', 'aHash')
+
+# 旋转哈希的哈希大小
+HASH_SIZE = 8
+
+# 批量比较时每次送入距离内核的候选文件对数
+PAIR_BLOCK_SIZE = 1 << 16
+
+# 批量比较时每次在桶索引中查询的文件数
+QUERY_BLOCK_SIZE = 32
+
+# 批量比较时进度日志的最小间隔（秒），阶段信息和错误不受限制
+PROGRESS_LOG_INTERVAL = 1.0
 
 
 class RotationInvariantHasher:
@@ -17,14 +53,21 @@ class RotationInvariantHasher:
     旋转不变哈希计算器
     """
     
-    def __init__(self, angles: List[int] = None):
+    def __init__(self, angles: List[int] = None, cache: Optional[HashCache] = None):
         """
         初始化旋转不变哈希计算器
         
         Args:
             angles: 要计算的旋转角度列表，默认为[0, 90, 180, 270]
+            cache: 哈希缓存，提供时未修改文件的旋转哈希直接从缓存读取，默认为None
         """
         self.angles = angles or [0, 90, 180, 270]
+        self.cache = cache
+    
+    @property
+    def cache_kind(self) -> str:
+        """缓存结果类型，角度不同的结果分开存储"""
+        return "rotation:{}:{}:draft".format(",".join(map(str, self.angles)), HASH_SIZE)
     
     def calculate_rotation_invariant_hashes(self, image_path: str) -> List[Dict]:
         """
@@ -36,42 +79,66 @@ class RotationInvariantHasher:
         Returns:
             包含多个角度哈希值的列表
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"文件不存在: {image_path}")
+        try:
+            stat = os.stat(image_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"文件不存在: {image_path}") from None
         
+        if self.cache is not None:
+            cached = self.cache.get(image_path, self.cache_kind, stat)
+            if cached is not None:
+                return cached
+        
+        hashes = self._compute_rotation_hashes(image_path)
+        if self.cache is not None:
+            self.cache.set(image_path, self.cache_kind, stat, hashes)
+        return hashes
+    
+    def _compute_rotation_hashes(self, image_path: str) -> List[Dict]:
+        """
+        解码图片并计算各角度的哈希值，不读写缓存
+        
+        Args:
+            image_path: 图片路径
+            
+        Returns:
+            包含多个角度哈希值的列表
+        """
         hashes = []
         
         try:
-            img = Image.open(image_path)
+            # 只解码和灰度转换一次，大JPEG直接缩小解码为灰度图
+            gray = _open_gray(image_path)
+            blocks = {}
+            
+            def block(size, resample):
+                # 同一尺寸的像素块只缩放一次
+                if size not in blocks:
+                    blocks[size] = np.asarray(gray.resize(size, resample))
+                return blocks[size]
             
             for angle in self.angles:
-                # 旋转图片
-                if angle == 0:
-                    rotated_img = img
-                else:
-                    rotated_img = img.rotate(angle, expand=True, fillcolor='white')
-                
-                # 创建临时文件
-                with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_file:
-                    temp_path = temp_file.name
-                    rotated_img.save(temp_path)
-                
-                try:
-                    # 计算哈希值
-                    dhash = calculate_dhash(temp_path)
-                    phash = calculate_phash(temp_path)
-                    ahash = calculate_ahash(temp_path)
-                    
+                if angle % 90 == 0:
+                    # 直角旋转只是像素重排，先缩放再旋转极小的像素块：pHash和aHash的方形像素块所有角度共用，
+                    # dHash的像素块在旋转90°或270°时宽高互换，按互换后的宽高另外缩放一次
+                    k = angle // 90 % 4
+                    dhash_size = (HASH_SIZE, HASH_SIZE + 1) if k % 2 else (HASH_SIZE + 1, HASH_SIZE)
                     hashes.append({
                         'angle': angle,
-                        'dhash': dhash,
-                        'phash': phash,
-                        'ahash': ahash
+                        'dhash': _dhash_from_pixels(np.rot90(block(dhash_size, SMALL_HASH_RESAMPLE), k)),
+                        'phash': _phash_from_pixels(np.rot90(block((HASH_SIZE * 4, HASH_SIZE * 4), PHASH_RESAMPLE), k)),
+                        'ahash': _ahash_from_pixels(np.rot90(block((HASH_SIZE, HASH_SIZE), SMALL_HASH_RESAMPLE), k))
                     })
-                finally:
-                    # 清理临时文件
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
+                    continue
+                
+                # 其他角度旋转整幅灰度图后计算
+                rotated_img = gray.rotate(angle, expand=True, fillcolor='white')
+                hashes.append({
+                    'angle': angle,
+                    'dhash': calculate_dhash_from_image(rotated_img),
+                    'phash': calculate_phash_from_image(rotated_img),
+                    'ahash': calculate_ahash_from_image(rotated_img)
+                })
         
         except Exception as e:
             raise ValueError(f"计算旋转不变哈希时出错: {image_path}, 错误: {str(e)}")
@@ -106,35 +173,28 @@ class RotationInvariantHasher:
         
         best_match = None
         
-        # 比较所有角度组合，找到最小距离
-        for h1 in hashes1:
-            for h2 in hashes2:
-                try:
-                    dhash_dist = hamming_distance(h1['dhash'], h2['dhash'])
-                    phash_dist = hamming_distance(h1['phash'], h2['phash'])
-                    ahash_dist = hamming_distance(h1['ahash'], h2['ahash'])
-                    
-                    if dhash_dist < min_distances['dhash']:
-                        min_distances['dhash'] = dhash_dist
-                    if phash_dist < min_distances['phash']:
-                        min_distances['phash'] = phash_dist
-                    if ahash_dist < min_distances['ahash']:
-                        min_distances['ahash'] = ahash_dist
-                    
-                    # 记录最佳匹配
-                    total_dist = dhash_dist + phash_dist + ahash_dist
-                    if best_match is None or total_dist < best_match['total_distance']:
-                        best_match = {
-                            'angle1': h1['angle'],
-                            'angle2': h2['angle'],
-                            'dhash_distance': dhash_dist,
-                            'phash_distance': phash_dist,
-                            'ahash_distance': ahash_dist,
-                            'total_distance': total_dist
-                        }
-                except Exception:
-                    # 如果计算距离失败，跳过这个组合
-                    continue
+        # 一次计算所有角度组合的距离：distances[角度1, 角度2, 哈希类型]
+        packed1, valid1 = pack_hashes(hashes1, ROTATION_HASH_KEYS)
+        packed2, valid2 = pack_hashes(hashes2, ROTATION_HASH_KEYS)
+        distances = popcount64(packed1[:, None, :] ^ packed2[None, :, :]).astype(np.int64)
+        distances = np.where(valid1[:, None, :] & valid2[None, :, :], distances, INVALID_DISTANCE)
+        
+        if distances.size:
+            # 每种哈希在所有角度组合中的最小距离
+            for c, key in enumerate(ROTATION_HASH_KEYS):
+                min_distances[key] = int(distances[:, :, c].min())
+            
+            # 总距离最小的角度组合为最佳匹配，距离相同时取先出现的组合
+            total = distances.sum(axis=2)
+            a1, a2 = np.unravel_index(np.argmin(total), total.shape)
+            best_match = {
+                'angle1': hashes1[a1]['angle'],
+                'angle2': hashes2[a2]['angle'],
+                'dhash_distance': int(distances[a1, a2, 0]),
+                'phash_distance': int(distances[a1, a2, 1]),
+                'ahash_distance': int(distances[a1, a2, 2]),
+                'total_distance': int(total[a1, a2])
+            }
         
         # 判断是否相似
         dhash_similar = min_distances['dhash'] < dhash_threshold
@@ -179,11 +239,205 @@ class RotationInvariantHasher:
         return -1
 
 
+def _rotation_hashes_one(file_path: str, angles: List[int]) -> Tuple[str, List[Dict], Optional[str]]:
+    """
+    在子进程中计算单个文件的旋转哈希
+
+    Args:
+        file_path: 图片路径
+        angles: 旋转角度列表
+
+    Returns:
+        (文件路径, 各角度的哈希列表, 错误信息)，失败时哈希列表为空
+    """
+    try:
+        return file_path, RotationInvariantHasher(angles).calculate_rotation_invariant_hashes(file_path), None
+    except Exception as e:
+        return file_path, [], str(e)
+
+
+def _rotation_index(packed: np.ndarray, valid: np.ndarray, thresholds: np.ndarray,
+                    min_votes: int = 2) -> List[Tuple[int, int, np.ndarray, np.ndarray, List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]]:
+    """
+    为各角度的哈希按位段建立桶索引
+
+    文件对相似要求至少min_votes种哈希在某个角度组合下距离小于阈值，
+    只需索引阈值最小的(K - min_votes + 1)种哈希；每种哈希按segment_bounds分段，
+    某个角度组合距离小于阈值的两个哈希至少有一段完全相同
+
+    Args:
+        packed: 形状为(文件数, 角度数, K)的uint64哈希数组
+        valid: 与packed形状相同的有效标记数组
+        thresholds: 长度为K的阈值数组，距离严格小于阈值视为相似
+        min_votes: 至少需要多少种哈希判断为相似
+
+    Returns:
+        (哈希类型, 阈值, 各段起始位, 各段掩码, 各段的表) 列表，
+        每段的表为(排序后的段值, 对应的哈希值, 对应的文件 * 角度数 + 角度行号)
+    """
+    k = packed.shape[2]
+    index = []
+    
+    for c in np.argsort(thresholds, kind='stable')[:k - min_votes + 1]:
+        limit = int(thresholds[c])
+        entries = np.flatnonzero(valid[:, :, c].ravel())
+        if limit <= 0 or not len(entries):
+            continue
+        
+        values = packed[:, :, c].ravel()[entries]
+        bounds = segment_bounds(values, limit)
+        lows = np.array([low for low, _ in bounds], dtype=np.uint64)
+        masks = np.array([(1 << (high - low)) - 1 for low, high in bounds], dtype=np.uint64)
+        tables = []
+        for low, mask in zip(lows, masks):
+            keys = (values >> low) & mask
+            order = np.argsort(keys, kind='stable')
+            tables.append((keys[order], values[order], entries[order]))
+        index.append((int(c), limit, lows, masks, tables))
+    
+    return index
+
+
+def _rotation_neighbors(index: List[Tuple[int, int, np.ndarray, np.ndarray, List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]],
+                        packed: np.ndarray, valid: np.ndarray, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    在桶索引中一次查询一批文件，找出每个文件之后可能与其相似的文件
+
+    Args:
+        index: _rotation_index返回的索引
+        packed: 形状为(文件数, 角度数, K)的uint64哈希数组
+        valid: 与packed形状相同的有效标记数组
+        start: 查询文件的起始行号
+        stop: 查询文件的结束行号（不含）
+
+    Returns:
+        (left, right) 行号数组，按left、right升序排列且无重复，每对满足left < right，
+        且至少一种哈希在某个角度组合下距离小于阈值
+    """
+    num_files, num_angles = packed.shape[:2]
+    found = [np.empty(0, dtype=np.int64)]
+    
+    for c, limit, lows, masks, tables in index:
+        # 查询文件各角度的哈希可能相同，同一文件相同的值只查一次
+        rows, _ = np.nonzero(valid[start:stop, :, c])
+        query = packed[start:stop, :, c][valid[start:stop, :, c]]
+        order = np.lexsort((query, rows))
+        rows, query = rows[order] + start, query[order]
+        first = np.ones(len(query), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (query[1:] != query[:-1])
+        rows, query = rows[first], query[first]
+        
+        for s, (keys, values, entries) in enumerate(tables):
+            segment = (query >> lows[s]) & masks[s]
+            starts = np.searchsorted(keys, segment, side='left')
+            lengths = np.searchsorted(keys, segment, side='right') - starts
+            total = int(lengths.sum())
+            if not total:
+                continue
+            
+            # 展开所有命中桶中的位置，只保留与对应查询哈希距离小于阈值的哈希
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            diff = values[positions] ^ np.repeat(query, lengths)
+            keep = popcount64(diff) < limit
+            # 在前面某一段已完全相同的哈希已由那一段的桶找到，不再重复加入
+            for e in range(s):
+                keep &= ((diff >> lows[e]) & masks[e]) != 0
+            
+            left = np.repeat(rows, lengths)[keep]
+            right = entries[positions[keep]] // num_angles
+            found.append(left[left < right] * num_files + right[left < right])
+    
+    pairs = np.unique(np.concatenate(found))
+    return pairs // num_files, pairs % num_files
+
+
+def _rotation_pair_stats_numpy(packed: np.ndarray, valid: np.ndarray, left: np.ndarray, right: np.ndarray,
+                               block_pairs: int = 1 << 14) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    _rotation_pair_stats的NumPy实现，按块广播计算全部角度组合的距离
+    """
+    num_angles, k = packed.shape[1:]
+    min_distances = np.empty((len(left), k), dtype=np.int64)
+    best = np.empty(len(left), dtype=np.int64)
+    
+    for start in range(0, len(left), block_pairs):
+        a = left[start:start + block_pairs]
+        b = right[start:start + block_pairs]
+        
+        # distances[文件对, 角度1, 角度2, 哈希类型]
+        distances = popcount64(packed[a][:, :, None, :] ^ packed[b][:, None, :, :]).astype(np.int64)
+        distances = np.where(valid[a][:, :, None, :] & valid[b][:, None, :, :], distances, INVALID_DISTANCE)
+        
+        min_distances[start:start + block_pairs] = distances.min(axis=(1, 2))
+        best[start:start + block_pairs] = distances.sum(axis=3).reshape(len(a), -1).argmin(axis=1)
+    
+    return min_distances, best
+
+
+if HAS_NUMBA:
+    @numba.njit(parallel=True, boundscheck=False, cache=True)
+    def _rotation_pair_stats_jit(packed, valid, left, right):
+        num_angles = packed.shape[1]
+        k = packed.shape[2]
+        min_distances = np.empty((len(left), k), dtype=np.int64)
+        best = np.empty(len(left), dtype=np.int64)
+        
+        for t in numba.prange(len(left)):
+            i = left[t]
+            j = right[t]
+            for c in range(k):
+                min_distances[t, c] = INVALID_DISTANCE
+            
+            best_total = np.iinfo(np.int64).max
+            best_combo = 0
+            for a1 in range(num_angles):
+                for a2 in range(num_angles):
+                    total = 0
+                    for c in range(k):
+                        if valid[i, a1, c] and valid[j, a2, c]:
+                            distance = np.int64(_popcount_jit(packed[i, a1, c] ^ packed[j, a2, c]))
+                        else:
+                            distance = INVALID_DISTANCE
+                        if distance < min_distances[t, c]:
+                            min_distances[t, c] = distance
+                        total += distance
+                    if total < best_total:
+                        best_total = total
+                        best_combo = a1 * num_angles + a2
+            best[t] = best_combo
+        
+        return min_distances, best
+
+
+def _rotation_pair_stats(packed: np.ndarray, valid: np.ndarray, left: np.ndarray,
+                         right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算文件对在所有角度组合中每种哈希的最小距离和总距离最小的角度组合
+
+    安装了Numba时使用编译的多线程内核，否则使用NumPy按块广播计算
+
+    Args:
+        packed: 形状为(文件数, 角度数, K)的uint64哈希数组
+        valid: 与packed形状相同的有效标记数组
+        left: 文件对第一个文件的行号数组
+        right: 文件对第二个文件的行号数组
+
+    Returns:
+        (最小距离, 最佳组合)：形状为(文件对数, K)的距离数组，以及编码为角度1 * 角度数 + 角度2的组合数组，
+        总距离相同时取先出现的组合
+    """
+    if HAS_NUMBA and len(left):
+        return _rotation_pair_stats_jit(np.ascontiguousarray(packed), np.ascontiguousarray(valid), left, right)
+    return _rotation_pair_stats_numpy(packed, valid, left, right)
+
+
 def batch_compare_with_rotation(image_files: List[str], 
                                dhash_threshold: int = 8,
                                phash_threshold: int = 2,
                                ahash_threshold: int = 2,
-                               log_callback=None) -> List[Dict]:
+                               log_callback=None,
+                               max_workers: Optional[int] = None,
+                               cache: Optional[HashCache] = None) -> List[Dict]:
     """
     批量比较图片，支持旋转识别（优化版本）
     
@@ -193,13 +447,14 @@ def batch_compare_with_rotation(image_files: List[str],
         phash_threshold: pHash阈值
         ahash_threshold: aHash阈值
         log_callback: 日志回调函数
+        max_workers: 预计算哈希的进程数，默认为CPU核心数与需要计算的文件数中的较小值，为1时在当前进程中计算
+        cache: 哈希缓存，提供时跳过未修改文件的旋转哈希计算，默认为None
         
     Returns:
         相似图片组列表
     """
-    hasher = RotationInvariantHasher()
+    hasher = RotationInvariantHasher(cache=cache)
     similar_groups = []
-    processed = set()
     
     def log(message):
         if log_callback:
@@ -207,136 +462,161 @@ def batch_compare_with_rotation(image_files: List[str],
         else:
             print(message)
     
+    last_progress = time.monotonic()
+    
+    def progress_due():
+        # 距上次进度日志超过间隔时返回True，避免大批量时频繁调用日志回调
+        nonlocal last_progress
+        now = time.monotonic()
+        if now - last_progress < PROGRESS_LOG_INTERVAL:
+            return False
+        last_progress = now
+        return True
+    
     log(f"开始旋转不变图片比较，共 {len(image_files)} 个文件...")
     
     # 预计算所有图片的旋转哈希值
     log("正在预计算所有图片的旋转哈希值...")
     all_hashes = {}
+    stats = {}
+    done = 0
     
-    for i, file_path in enumerate(image_files):
-        if i % 100 == 0 and i > 0:
-            log(f"已预计算 {i}/{len(image_files)} 个文件的哈希值...")
+    def record(file_path, hashes, error):
+        nonlocal done
+        if done > 0 and progress_due():
+            log(f"已预计算 {done}/{len(image_files)} 个文件的哈希值...")
+        done += 1
         
-        try:
-            all_hashes[file_path] = hasher.calculate_rotation_invariant_hashes(file_path)
-        except Exception as e:
-            log(f"计算哈希值失败: {file_path}, 错误: {str(e)}")
-            continue
+        if error is not None:
+            log(f"计算哈希值失败: {file_path}, 错误: {error}")
+        else:
+            all_hashes[file_path] = hashes
+            if file_path in stats:
+                cache.set(file_path, hasher.cache_kind, stats[file_path], hashes)
+    
+    # 缓存在主进程中读写，只把未命中的文件交给计算
+    pending = []
+    for file_path in image_files:
+        cached = None
+        if cache is not None:
+            try:
+                stat = os.stat(file_path)
+                cached = cache.get(file_path, hasher.cache_kind, stat)
+                if cached is None:
+                    stats[file_path] = stat
+            except OSError:
+                pass
+        if cached is not None:
+            done += 1
+            all_hashes[file_path] = cached
+        else:
+            pending.append(file_path)
+    
+    if len(pending) < len(image_files):
+        log(f"从缓存读取了 {len(image_files) - len(pending)} 个文件的旋转哈希值")
+    
+    max_workers = max_workers or min(os.cpu_count() or 1, max(len(pending), 1))
+    if max_workers > 1 and len(pending) > 1:
+        # 解码、缩放和哈希计算受GIL限制，按文件分给多个进程，日志在主进程中输出
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=PROCESS_CONTEXT) as executor:
+            futures = [executor.submit(_rotation_hashes_one, file_path, hasher.angles) for file_path in pending]
+            for future in as_completed(futures):
+                record(*future.result())
+    else:
+        for file_path in pending:
+            record(*_rotation_hashes_one(file_path, hasher.angles))
+    
+    if cache is not None:
+        cache.commit()
     
     log(f"哈希值预计算完成，开始比较...")
     
-    # 使用预计算的哈希值进行比较
-    for i, file1 in enumerate(image_files):
-        if file1 in processed or file1 not in all_hashes:
-            continue
-        
-        if i % 50 == 0 and i > 0:
-            log(f"已处理 {i}/{len(image_files)} 个文件...")
+    # 每个文件各角度的哈希打包为(文件数, 角度数, 3)的uint64数组，
+    # 比较时一次计算一个文件与其余所有候选文件在全部角度组合上的距离
+    hashed_files = [file_path for file_path in image_files if file_path in all_hashes]
+    num_angles = len(hasher.angles)
+    packed, valid = pack_hashes([h for file_path in hashed_files for h in all_hashes[file_path]], ROTATION_HASH_KEYS)
+    packed = np.ascontiguousarray(packed.reshape(len(hashed_files), num_angles, len(ROTATION_HASH_KEYS)))
+    valid = np.ascontiguousarray(valid.reshape(packed.shape))
+    thresholds = np.array([dhash_threshold, phash_threshold, ahash_threshold])
+    
+    # 打包后不再需要逐文件的哈希字典；各文件的哈希列表都按hasher.angles的顺序排列
+    all_hashes.clear()
+    
+    # 建立桶索引，每个文件只与同桶的文件比较全部角度组合，避免O(N²)的全量比较
+    index = _rotation_index(packed, valid, thresholds)
+    
+    # 用并查集合并相似文件对，得到传递闭包的相似组，与遍历顺序无关；
+    # under_any[n]记录第n个文件与排在其后的相似文件之间低于阈值的哈希，用于确定相似原因
+    dsu = DisjointSet(len(hashed_files))
+    under_any = np.zeros((len(hashed_files), len(ROTATION_HASH_KEYS)), dtype=bool)
+    left_blocks, right_blocks = [], []
+    pending_pairs = 0
+    
+    def flush():
+        # 一次计算多个文件的候选文件对，避免每个文件单独调用多线程内核
+        nonlocal pending_pairs
+        left = np.concatenate(left_blocks)
+        right = np.concatenate(right_blocks)
+        left_blocks.clear()
+        right_blocks.clear()
+        pending_pairs = 0
         
-        similar_files = []
-        rotation_info = []
+        min_distances_all, _ = _rotation_pair_stats(packed, valid, left, right)
         
-        hashes1 = all_hashes[file1]
+        # 使用多重验证机制（至少两种算法判断为相似）
+        under = min_distances_all < thresholds
+        matches = under.sum(axis=1) >= 2
+        np.logical_or.at(under_any, left[matches], under[matches])
+        dsu.union_pairs(left[matches].tolist(), right[matches].tolist())
+    
+    for start in range(0, len(hashed_files), QUERY_BLOCK_SIZE):
+        if start > 0 and progress_due():
+            log(f"已处理 {start}/{len(hashed_files)} 个文件...")
         
-        for j, file2 in enumerate(image_files[i+1:], i+1):
-            if file2 in processed or file2 not in all_hashes:
-                continue
-            
-            try:
-                hashes2 = all_hashes[file2]
-                
-                # 快速比较预计算的哈希值
-                min_distances = {
-                    'dhash': float('inf'),
-                    'phash': float('inf'),
-                    'ahash': float('inf')
-                }
-                
-                best_match = None
-                
-                # 比较所有角度组合，找到最小距离
-                for h1 in hashes1:
-                    for h2 in hashes2:
-                        try:
-                            dhash_dist = hamming_distance(h1['dhash'], h2['dhash'])
-                            phash_dist = hamming_distance(h1['phash'], h2['phash'])
-                            ahash_dist = hamming_distance(h1['ahash'], h2['ahash'])
-                            
-                            if dhash_dist < min_distances['dhash']:
-                                min_distances['dhash'] = dhash_dist
-                            if phash_dist < min_distances['phash']:
-                                min_distances['phash'] = phash_dist
-                            if ahash_dist < min_distances['ahash']:
-                                min_distances['ahash'] = ahash_dist
-                            
-                            # 记录最佳匹配
-                            total_dist = dhash_dist + phash_dist + ahash_dist
-                            if best_match is None or total_dist < best_match['total_distance']:
-                                best_match = {
-                                    'angle1': h1['angle'],
-                                    'angle2': h2['angle'],
-                                    'dhash_distance': dhash_dist,
-                                    'phash_distance': phash_dist,
-                                    'ahash_distance': ahash_dist,
-                                    'total_distance': total_dist
-                                }
-                        except Exception:
-                            continue
-                
-                # 判断是否相似
-                dhash_similar = min_distances['dhash'] < dhash_threshold
-                phash_similar = min_distances['phash'] < phash_threshold
-                ahash_similar = min_distances['ahash'] < ahash_threshold
-                
-                # 使用多重验证机制（至少两种算法判断为相似）
-                similar_count = sum([dhash_similar, phash_similar, ahash_similar])
-                is_similar = similar_count >= 2
-                
-                if is_similar:
-                    similar_files.append(file2)
-                    
-                    # 记录旋转信息
-                    if best_match:
-                        angle_diff = abs(best_match['angle1'] - best_match['angle2'])
-                        if angle_diff > 180:
-                            angle_diff = 360 - angle_diff
-                        
-                        rotation_info.append({
-                            'file': file2,
-                            'rotation_angle': angle_diff,
-                            'distances': min_distances
-                        })
+        # 只比较排在后面的候选文件，每个文件对只计算一次
+        left, right = _rotation_neighbors(index, packed, valid, start, min(start + QUERY_BLOCK_SIZE, len(hashed_files)))
+        if len(left):
+            left_blocks.append(left)
+            right_blocks.append(right)
+            pending_pairs += len(left)
+            if pending_pairs >= PAIR_BLOCK_SIZE:
+                flush()
+    
+    if pending_pairs:
+        flush()
+    
+    # 组内距离和旋转角度均相对于基准文件（组内第一个文件）计算，所有组一次算完
+    groups = dsu.groups()
+    anchors = np.array([members[0] for members in groups for _ in members[1:]], dtype=np.int64)
+    others = np.array([row for members in groups for row in members[1:]], dtype=np.int64)
+    min_distances_all, best = _rotation_pair_stats(packed, valid, anchors, others)
+    
+    t = 0
+    for members in groups:
+        rotation_info = []
+        for row2 in members[1:]:
+            a1, a2 = divmod(int(best[t]), num_angles)
+            angle_diff = abs(hasher.angles[a1] - hasher.angles[a2])
+            if angle_diff > 180:
+                angle_diff = 360 - angle_diff
             
-            except Exception as e:
-                log(f"比较文件时出错: {file1} vs {file2}, 错误: {str(e)}")
-                continue
+            rotation_info.append({
+                'file': hashed_files[row2],
+                'rotation_angle': angle_diff,
+                'distances': {key: int(min_distances_all[t, c]) for c, key in enumerate(ROTATION_HASH_KEYS)}
+            })
+            t += 1
         
-        if similar_files:
-            # 构建相似组
-            all_files = [file1] + similar_files
-            
-            # 确定主要原因
-            reasons = []
-            if any(info['distances']['dhash'] < dhash_threshold for info in rotation_info):
-                reasons.append("dHash")
-            if any(info['distances']['phash'] < phash_threshold for info in rotation_info):
-                reasons.append("pHash")
-            if any(info['distances']['ahash'] < ahash_threshold for info in rotation_info):
-                reasons.append("aHash")
-            
-            reason = "+".join(reasons) + "相似(支持旋转)"
-            
-            similar_group = {
-                'reason': reason,
-                'files': all_files,
-                'rotation_info': rotation_info
-            }
-            
-            similar_groups.append(similar_group)
-            
-            # 标记为已处理
-            for file_path in all_files:
-                processed.add(file_path)
+        # 确定主要原因：组内任一相似文件对低于阈值的哈希
+        group_under = under_any[members].any(axis=0)
+        reason = "+".join(name for name, hit in zip(ROTATION_HASH_NAMES, group_under) if hit) + "相似(支持旋转)"
+        
+        similar_groups.append({
+            'reason': reason,
+            'files': [hashed_files[row] for row in members],
+            'rotation_info': rotation_info
+        })
     
     log(f"旋转不变比较完成，找到 {len(similar_groups)} 个相似组")
     return similar_groups
\ No newline at end of file